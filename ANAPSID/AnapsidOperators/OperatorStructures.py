@@ -2,6 +2,9 @@
 Created on Jul 10, 2011
 
 Implements the structures used by the ANAPSID Operators.
+The timestamps are sequence numbers of the operator that owns the
+structures, incremented at every event (arrival, flush, second stage),
+so two events are never simultaneous.
 
 @author: Maribel Acosta Deibe
 '''
@@ -14,6 +17,8 @@ class Record(object):
     It is composed by a tuple, probeTS (timestamp when the tuple was probed)
     and insertTS (timestamp when the tuple was inserted in the table).
     '''
+    __slots__ = ('tuple', 'probeTS', 'insertTS', 'flushTS')
+
     def __init__(self, tuple, probeTS, insertTS=None, flushTS=None):
         self.tuple    = tuple
         self.probeTS  = probeTS
@@ -23,13 +28,17 @@ class Record(object):
 class RJTTail(object):
     '''
     Represents the tail of a RJT.
-    It is composed by a list of records and rjtprobeTS 
-    (timestamp when the last tuple in the RJT was probed).
+    It is composed by a list of records, rjtprobeTS 
+    (timestamp when the last tuple in the RJT was probed), and the
+    size of its records (in bytes), if it is tracked.
     '''
+    __slots__ = ('records', 'rjtProbeTS', 'flushTS', 'size')
+
     def __init__(self, record, rjtProbeTS):
         self.records = [record]
         self.rjtProbeTS = rjtProbeTS
         self.flushTS = float("inf")
+        self.size = 0
         
     def updateRecords(self, record):
         self.records.append(record)
@@ -41,11 +50,12 @@ class RJTTail(object):
 class FileDescriptor(object):
     '''
     Represents the description of a file, that contains a RJT in sec mem.
-    It is composed by the name of the file, the associated resource, 
+    It is composed by the file (SpillFile), the associated resource, 
     the current size (number of tuples), and the timestamp of the last
     RJTTail that have been flushed.
     '''
-    
+    __slots__ = ('file', 'size', 'lastFlushTS')
+
     def __init__(self, file, size, lastFlushTS):
         self.file = file
         self.size = size
@@ -2,36 +2,215 @@
 Created on Dec 11, 2013
 
 Implements the Xdistinct operator.
-The intermediate results are represented in a queue. 
+The intermediate results are represented in a queue.
+
+A tuple is represented by a fingerprint of 128 bits (MD5) of its values,
+taken in a fixed order of the variables; with EXACT, by the serialized
+values themselves. The keys are kept in main memory while they take at
+most memorySize bytes; then they are flushed, sorted, to runs in
+secondary memory, partitioned by hash. A new tuple is looked up in main
+memory and in the runs of its partition, so the distinct tuples are
+still produced as they arrive. The last runs of a partition are merged
+while they are of similar size.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
+import os
+import mmap
+import struct
+import marshal
+from hashlib import md5
+from bisect import bisect_right
+from heapq import merge
+from operator import itemgetter
+from sys import getsizeof
+from tempfile import NamedTemporaryFile
+from ANAPSID.Operators.Channel import Channel
+
+MEMORY_SIZE = 256 * 1024 * 1024   # Bytes of the keys in main memory.
+EXACT       = False               # Keep the values instead of their fingerprints.
+PARTITIONS  = 16
+INDEX_STEP  = 16                  # Keys of a run per entry of its index.
+ENTRY_SIZE  = 40                  # Bytes of an entry of the set besides its key.
+LENGTH      = struct.Struct('<I')
+
+
+def configure(memorySize=None, exact=None):
+    # Called before the plan is executed.
+    global MEMORY_SIZE, EXACT
+    if memorySize is not None:
+        MEMORY_SIZE = memorySize
+    if exact is not None:
+        EXACT = exact
+
 
 class Xdistinct(object):
-    
-    def __init__(self, vars):
-        #self.input       = Queue()
-        self.qresults   = Queue()
+
+    def __init__(self, vars, memorySize=None):
+        #self.input       = Channel()
+        self.qresults   = Channel()
         self.vars  = vars
-        self.bag = {} 
-        
+        self.memorySize = memorySize or MEMORY_SIZE
+
     def execute(self, left, dummy, out):
         # Executes the Xdistinct.
         self.left = left
         self.qresults = out
+        self.bag = DistinctSet(self.memorySize)
         tuple = self.left.get(True)
-        
+
         while (not(tuple == "EOF")):
-            str_tuple = str(sorted(tuple.items()))
-            get = self.bag.get(str_tuple, False)
-            
-            if not(get):
+            if self.bag.add(tuple):
                 self.qresults.put(tuple)
-                self.bag.update({str_tuple : True})
             tuple = self.left.get(True)
-            
-        # Put EOF in queue and exit. 
+
+        # Delete the runs, put EOF in queue and exit.
+        self.bag.close()
         self.qresults.put("EOF")
         return
-    
+
+
+class DistinctSet(object):
+    '''
+    Represents the set of the tuples produced by a distinct operator.
+    It is composed by the keys in main memory and their size (in bytes),
+    the runs of keys in secondary memory of every partition, and the
+    order of the variables of the keys, taken from the first tuple.
+    '''
+    def __init__(self, memorySize=None):
+        self.memorySize = memorySize or MEMORY_SIZE
+        self.exact      = EXACT
+        self.keys       = set()
+        self.memory     = 0
+        self.runs       = [[] for i in xrange(PARTITIONS)]
+        self.spilled    = False
+        self.getter     = None
+        self.width      = 0
+
+    def key(self, tuple):
+        # Serializes the values of the tuple, in the order of the variables.
+        if self.getter is None:
+            vars = sorted(tuple.keys())
+            self.getter = itemgetter(*vars) if vars else (lambda tuple: ())
+            self.width = len(vars)
+        try:
+            if (len(tuple) != self.width):
+                raise KeyError
+            data = marshal.dumps(self.getter(tuple), 0)
+        except KeyError:
+            # The tuple has other variables.
+            data = marshal.dumps(sorted(tuple.items()), 0)
+        except ValueError:
+            # Values that marshal does not support.
+            data = repr(sorted(tuple.items()))
+        if self.exact:
+            return data
+        return md5(data).digest()
+
+    def add(self, tuple):
+        # Adds the tuple. Returns False if it was already in the set.
+        key = self.key(tuple)
+        if key in self.keys:
+            return False
+        if self.spilled:
+            for run in self.runs[hash(key) % PARTITIONS]:
+                if key in run:
+                    return False
+        self.keys.add(key)
+        self.memory += getsizeof(key) + ENTRY_SIZE
+        if (self.memory > self.memorySize):
+            self.spill()
+        return True
+
+    def spill(self):
+        # Flushes the keys in main memory to a run of every partition.
+        partitions = [[] for i in xrange(PARTITIONS)]
+        for key in self.keys:
+            partitions[hash(key) % PARTITIONS].append(key)
+        self.keys = set()
+        self.memory = 0
+        self.spilled = True
+        for (p, keys) in enumerate(partitions):
+            if keys:
+                keys.sort()
+                runs = self.runs[p]
+                runs.append(KeyRun(keys))
+                # Merge the last runs while they are of similar size, so
+                # a partition has a logarithmic number of runs.
+                while (len(runs) > 1) and (2 * runs[-1].bytes >= runs[-2].bytes):
+                    (first, second) = runs[-2:]
+                    runs[-2:] = [KeyRun(merge(first.keys(), second.keys()))]
+                    first.remove()
+                    second.remove()
+
+    def close(self):
+        for runs in self.runs:
+            for run in runs:
+                run.remove()
+        self.runs = [[] for i in xrange(PARTITIONS)]
+
+
+class KeyRun(object):
+    '''
+    Represents a run of sorted keys in secondary memory.
+    It is composed by the name of the file, its size (in bytes), its
+    mapping, and a sparse index with the first key of every block of
+    INDEX_STEP keys and its position.
+    '''
+    def __init__(self, keys):
+        file = NamedTemporaryFile(suffix=".dst", prefix="", delete=False)
+        self.name      = file.name
+        self.index     = []
+        self.positions = []
+        position = 0
+        parts = []
+        for (i, key) in enumerate(keys):
+            if (i % INDEX_STEP == 0):
+                self.index.append(key)
+                self.positions.append(position)
+            parts.append(LENGTH.pack(len(key)))
+            parts.append(key)
+            position += LENGTH.size + len(key)
+            if (len(parts) >= 2 * 4096):
+                file.write(''.join(parts))
+                parts = []
+        file.write(''.join(parts))
+        file.close()
+        self.bytes = position
+        file = open(self.name, 'rb')
+        try:
+            self.mapping = mmap.mmap(file.fileno(), self.bytes, access=mmap.ACCESS_READ)
+        finally:
+            file.close()
+
+    def keys(self):
+        # Yields the keys of the run, in order.
+        (mapping, position) = (self.mapping, 0)
+        while (position < self.bytes):
+            (n,) = LENGTH.unpack_from(mapping, position)
+            position += LENGTH.size
+            yield mapping[position:position + n]
+            position += n
+
+    def __contains__(self, key):
+        # Looks the key up in its block.
+        i = bisect_right(self.index, key) - 1
+        if (i < 0):
+            return False
+        position = self.positions[i]
+        end = self.positions[i + 1] if (i + 1 < len(self.positions)) else self.bytes
+        mapping = self.mapping
+        while (position < end):
+            (n,) = LENGTH.unpack_from(mapping, position)
+            position += LENGTH.size
+            k = mapping[position:position + n]
+            if (k == key):
+                return True
+            if (k > key):
+                return False
+            position += n
+        return False
+
+    def remove(self):
+        self.mapping.close()
+        os.remove(self.name)
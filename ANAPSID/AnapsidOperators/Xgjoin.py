@@ -4,45 +4,101 @@ Created on Jul 10, 2011
 Implements the Xgjoin operator.
 The intermediate results are represented as a queue.
 
+The RJTs are kept in main memory while their records take at most
+memorySize bytes; then the RJTs probed least recently are flushed to
+secondary memory. The victims are taken from a heap of the probe
+timestamps of the RJTs, where an entry is outdated once its RJT is
+probed again or flushed. MEMORY_SIZE is divided among the Xgjoins of a
+plan (shareMemory).
+
+The sources are blocked when no tuple has arrived from them for
+timeoutSecondStage seconds, measured by each operator on a monotonic
+clock; then the second stage joins the RJTs in main memory with the
+flushed ones, until a tuple arrives. The timeout adapts to the time the
+sources usually make the operator wait: BLOCKED_FACTOR times its
+average, between MIN_BLOCKED_TIMEOUT and BLOCKED_TIMEOUT.
+
 @author: Maribel Acosta Deibe
 '''
-import signal
-from multiprocessing import Queue
+from sys import getsizeof
+from heapq import heappush, heappop, heapify
+from ANAPSID.Operators.Channel import Channel, wait
+from ANAPSID.Operators.Clock import monotonic
 from Queue import Empty
-from time import time
-from tempfile import NamedTemporaryFile
-from os import remove
 from ANAPSID.Operators.Join import Join
+from ANAPSID.Operators.JoinKey import joinKey
+from ANAPSID.Operators.SpillFile import SpillFile
 from OperatorStructures import Record, RJTTail, FileDescriptor
 
+MEMORY_SIZE = 1024 * 1024 * 1024   # Bytes of the RJTs in main memory of a plan.
+
+BLOCKED_TIMEOUT     = 2.0    # Seconds without tuples before the sources are blocked, at most.
+MIN_BLOCKED_TIMEOUT = 0.05
+BLOCKED_FACTOR      = 4.0    # Times the average wait for a tuple.
+
+# Bytes of a record besides its tuple, and of an item of a tuple besides its value.
+RECORD_SIZE = getsizeof(Record(None, 0)) + 8
+ITEM_SIZE   = 24
+
+
+def configure(memorySize=None, blockedTimeout=None, blockedFactor=None):
+    # Called before the plan is created.
+    global MEMORY_SIZE, BLOCKED_TIMEOUT, BLOCKED_FACTOR
+    if memorySize is not None:
+        MEMORY_SIZE = memorySize
+    if blockedTimeout is not None:
+        BLOCKED_TIMEOUT = blockedTimeout
+    if blockedFactor is not None:
+        BLOCKED_FACTOR = blockedFactor
+
+def shareMemory(joins):
+    # Divides MEMORY_SIZE among the Xgjoins of a plan.
+    for join in joins:
+        join.memorySize = MEMORY_SIZE // len(joins)
+
+def recordSize(tuple):
+    # Estimates the bytes of a record of the tuple.
+    size = RECORD_SIZE + getsizeof(tuple)
+    for value in tuple.itervalues():
+        size += ITEM_SIZE + getsizeof(value)
+    return size
+
+
 class Xgjoin(Join):
 
-    def __init__(self, vars):
+    def __init__(self, vars, memorySize=None):
         self.left_table  = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.vars        = vars
+        self.key         = joinKey(vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
         # Second stage settings
         self.secondStagesTS     = []
         self.lastSecondStageTS  = float("-inf")
-        self.timeoutSecondStage = 100000000
+        self.secondStages       = {}       # (table, resource): times it was probed in stage 2.
+        self.timeoutSecondStage = BLOCKED_TIMEOUT
         self.sourcesBlocked     = False
+        self.averageWait        = None     # Average seconds waited for a tuple.
+        self.inputs             = []       # Queues that have not ended.
 
         # Main memory settings
-        self.memorySize   = 100000000        # Represents the main memory size (# tuples).OLD:Represents the main memory size (in KB).
+        self.memorySize   = memorySize or MEMORY_SIZE  # Represents the main memory size (in bytes).
         self.fileDescriptor_left = {}
         self.fileDescriptor_right = {}
         self.memory_left  = 0
         self.memory_right = 0
+        self.memory       = 0        # Bytes of the records in main memory.
+        self.victims      = []       # Heap of (rjtProbeTS, table, resource).
 
     def instantiate(self, d):
         newvars = self.vars - set(d.keys())
-        return Xgjoin(newvars)
+        return Xgjoin(newvars, self.memorySize)
 
     def instantiateFilter(self, instantiated_vars, filter_str):
         newvars = self.vars - set(instantiated_vars)
-        return Xgjoin(newvars)
+        return Xgjoin(newvars, self.memorySize)
 
     def execute(self, left, right, out):
         # Executes the Xgjoin.
@@ -55,18 +111,32 @@ class Xgjoin(Join):
         tuple1 = None
         tuple2 = None
 
-        # Create alarm to go to stage 2.
-        signal.signal(signal.SIGALRM, self.stage2)
+        lastTupleTS = monotonic()   # When the last tuple was received.
+        blocked = False             # Whether stage 2 ran since then.
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple, or
+            # until the sources are blocked, if there are RJTs flushed.
+            self.inputs = [q for (q, t) in ((self.left, tuple1), (self.right, tuple2)) if t != "EOF"]
+            timeout = None
+            if not blocked and (self.fileDescriptor_left or self.fileDescriptor_right):
+                timeout = max(0, lastTupleTS + self.timeoutSecondStage - monotonic())
+            waitTS = monotonic()
+            if not wait(self.inputs, timeout):
+                if (timeout is not None) and (monotonic() - lastTupleTS >= self.timeoutSecondStage):
+                    self.stage2()
+                    blocked = True
+                continue
+            self.adaptTimeout(monotonic() - waitTS)
+            lastTupleTS = monotonic()
+            blocked = False
 
             # Try to get and process tuple from left queue.
             if (not(tuple1 == "EOF")):
                 try :
                     tuple1 = self.left.get(False)
                     #print "tuple1", tuple1
-                    signal.alarm(self.timeoutSecondStage)
                     self.stage1(tuple1, self.left_table, self.right_table)
                     self.memory_right += 1
                 except Empty:
@@ -75,17 +145,12 @@ class Xgjoin(Join):
                 except TypeError:
                     # TypeError: in resource = resource + tuple[var], when the tuple is "EOF".
                     pass
-                except IOError:
-                    # IOError: when a tuple is received, but the alarm is fired.
-                    self.sourcesBlocked = False
-                    pass
 
             # Try to get and process tuple from right queue.
             if (not(tuple2 == "EOF")):
                 try:
                     tuple2 = self.right.get(False)
                     #print "tuple2", tuple2
-                    signal.alarm(self.timeoutSecondStage)
                     self.stage1(tuple2, self.right_table, self.left_table)
                     self.memory_left += 1
                 except Empty:
@@ -94,18 +159,12 @@ class Xgjoin(Join):
                 except TypeError:
                     # TypeError: in resource = resource + tuple[var], when the tuple is "EOF".
                     pass
-                except IOError:
-                    # IOError: when a tuple is received, but the alarm is fired.
-                    self.sourcesBlocked = False
-                    pass
 
 
-            if (len(self.left_table) + len(self.right_table) >= self.memorySize):
+            while (self.memory > self.memorySize) and self.victims:
                 self.flushRJT()
                 #print "Flushed RJT!"
 
-        # Turn off alarm to stage 2.
-        signal.alarm(0)
         # Perform the last probes.
         self.stage3()
 
@@ -114,28 +173,41 @@ class Xgjoin(Join):
         #print " Stage 1: While one of the sources is sending data."
         if (tuple != "EOF"):
             # Get the resource associated to the tuples.
-            resource = ''
-            #print(tuple)
-            for var in self.vars:
-                resource = resource + str(tuple[var])
+            resource = self.key(tuple)
 
             # Probe the tuple against its RJT table.
             probeTS = self.probe(tuple, resource, tuple_rjttable)
 
             # Create the records.
-            record = Record(tuple, probeTS, time(), float("inf"))
+            record = Record(tuple, probeTS, probeTS, float("inf"))
 
             # Insert the record in the other RJT table.
             if resource in other_rjttable:
                 other_rjttable.get(resource).updateRecords(record)
-                other_rjttable.get(resource).setRJTProbeTS(probeTS)
                 #other_rjttable.get(resource).append(record)
             else:
                 tail = RJTTail(record, probeTS)
                 other_rjttable[resource] = tail
                 #other_rjttable[resource] = [record]
+            self.setProbeTS(other_rjttable, resource, probeTS)
+            size = recordSize(tuple)
+            other_rjttable[resource].size += size
+            self.memory += size
+
+    def adaptTimeout(self, waited):
+        # The sources are blocked when they make the operator wait
+        # BLOCKED_FACTOR times longer than usual.
+        if waited < 0.001:
+            # The tuple was already there.
+            return
+        if self.averageWait is None:
+            self.averageWait = waited
+        else:
+            self.averageWait = 0.8 * self.averageWait + 0.2 * waited
+        self.timeoutSecondStage = min(BLOCKED_TIMEOUT,
+                                      max(MIN_BLOCKED_TIMEOUT, BLOCKED_FACTOR * self.averageWait))
 
-    def stage2(self, signum, frame):
+    def stage2(self):
         #print " Stage 2: When both sources become blocked."
         self.sourcesBlocked = True
 
@@ -144,26 +216,36 @@ class Xgjoin(Join):
         resources2 = set(self.right_table.keys()) & set(self.fileDescriptor_left.keys())
 
         # Iterate while there are common resources and both sources are blocked.
+        # The time a resource is probed is kept, so its answers are not
+        # produced again in stage 3. The probeTS of the records are not
+        # changed: they tell whether the records met in main memory.
         while((resources1 or resources2) and self.sourcesBlocked):
 
             if (resources1):
                 resource = resources1.pop()
+                self.timestamp += 1
+                stageTS = self.timestamp
                 rjts1 = self.left_table[resource].records
                 for rjt1 in rjts1:
-                    probed = self.probeFile(rjt1, self.fileDescriptor_right, resource, 2)
-                    if (probed):
-                        rjt1.probeTS = time()
+                    self.probeFile(rjt1, self.fileDescriptor_right, resource, 2)
+                self.secondStages.setdefault((0, resource), []).append(stageTS)
 
             elif (resources2):
                 resource = resources2.pop()
+                self.timestamp += 1
+                stageTS = self.timestamp
                 rjts1 = self.right_table[resource].records
                 for rjt1 in rjts1:
-                    probed = self.probeFile(rjt1, self.fileDescriptor_left, resource, 2)
-                    if (probed):
-                        rjt1.probeTS = time()
+                    self.probeFile(rjt1, self.fileDescriptor_left, resource, 2)
+                self.secondStages.setdefault((1, resource), []).append(stageTS)
+
+            # The sources are not blocked anymore when a tuple arrives.
+            if wait(self.inputs, 0):
+                self.sourcesBlocked = False
 
         # End of second stage.
-        self.lastSecondStageTS = time()
+        self.timestamp += 1
+        self.lastSecondStageTS = self.timestamp
         self.secondStagesTS.append(self.lastSecondStageTS)
 
 #        fd_left  = len(set(map(FileDescriptor.getSize, self.fileDescriptor_left.values())))
@@ -207,27 +289,25 @@ class Xgjoin(Join):
         # RJTs in secondary memory are probed to produce new results.
         common_resources = set(self.fileDescriptor_left.keys()) & set(self.fileDescriptor_right.keys())
         for resource in common_resources:
-            file1 = open(self.fileDescriptor_right[resource].file.name)
-            rjts1 = file1.readlines()
-            for rjt1 in rjts1:
-                (tuple1, probeTS1, insertTS1, flushTS1) = rjt1.split('|')
-                self.probeFile(Record(eval(tuple1), float(probeTS1), float(insertTS1), float(flushTS1)), self.fileDescriptor_left, resource, 3)
-            file1.close()
+            file1 = self.fileDescriptor_right[resource].file
+            mapping = file1.map()
+            for rjt1 in file1.records(mapping):
+                self.probeFile(Record(*rjt1), self.fileDescriptor_left, resource, 3)
+            mapping.close()
 
         for resource in common_resources:
-            file1 = open(self.fileDescriptor_left[resource].file.name)
-            rjts1 = file1.readlines()
-            for rjt1 in rjts1:
-                (tuple1, probeTS1, insertTS1, flushTS1) = rjt1.split('|')
-                self.probeFile(Record(eval(tuple1), float(probeTS1), float(insertTS1), float(flushTS1)), self.fileDescriptor_right, resource, 3)
-            file1.close()
+            file1 = self.fileDescriptor_left[resource].file
+            mapping = file1.map()
+            for rjt1 in file1.records(mapping):
+                self.probeFile(Record(*rjt1), self.fileDescriptor_right, resource, 3)
+            mapping.close()
 
         # Delete files from secondary memory.
         for resource in self.fileDescriptor_left:
-            remove(self.fileDescriptor_left[resource].file.name)
+            self.fileDescriptor_left[resource].file.remove()
 
         for resource in self.fileDescriptor_right:
-            remove(self.fileDescriptor_right[resource].file.name)
+            self.fileDescriptor_right[resource].file.remove()
 
         # Put EOF in queue and exit.
         self.qresults.put("EOF")
@@ -236,10 +316,12 @@ class Xgjoin(Join):
     def probe(self, tuple, resource, rjttable):
         # Probe a tuple against its corresponding table.
 
-        probeTS = time()
+        # The tuple is inserted with the same timestamp, right after.
+        self.timestamp += 1
+        probeTS = self.timestamp
         # If the resource is in table, produce results.
         if resource in rjttable:
-            rjttable.get(resource).setRJTProbeTS(probeTS)
+            self.setProbeTS(rjttable, resource, probeTS)
             list_records = rjttable[resource].records
 
             for record in list_records:
@@ -256,117 +338,103 @@ class Xgjoin(Join):
     def probeFile(self, rjt1, filedescriptor2, resource, stage):
         # Probe an RJT against its corresponding partition in secondary memory.
 
-        file2 = open(filedescriptor2[resource].file.name, 'r')
-        rjts2 = file2.readlines()
-        st = ""
+        file2 = filedescriptor2[resource].file
+        mapping = file2.map()
         probed = False
 
+        # Times rjt1's resource was probed in stage 2, from rjt1's table.
+        side = 0 if (filedescriptor2 is self.fileDescriptor_right) else 1
+        secondStages = self.secondStages.get((side, resource), ())
 
-        for rjt2 in rjts2:
-            (tuple2, probeTS2, insertTS2, flushTS2) = rjt2.split('|')
+        for (tuple2, probeTS2, insertTS2, flushTS2) in file2.records(mapping):
             probedStage1 = False
             probedStage2 = False
 
             #Checking Property 2: Probed in stage 2.
-            for ss in self.secondStagesTS:
-                if (float(flushTS2) < rjt1.insertTS and rjt1.insertTS < ss and  ss < rjt1.flushTS):
+            for ss in secondStages:
+                if (flushTS2 < rjt1.insertTS and rjt1.insertTS < ss and  ss < rjt1.flushTS):
                     probedStage2 = True
                     break
 
             # Checking Property 1: Probed in stage 1.
-            if (rjt1.probeTS < float(flushTS2)):
+            if (rjt1.probeTS < flushTS2):
                 probedStage1 = True
 
             # Produce result if it has not been produced.
             if (not(probedStage1) and not(probedStage2)):
                 res = rjt1.tuple.copy()
-                res.update(eval(tuple2))
+                res.update(tuple2)
                 self.qresults.put(res)
                 probed = True
 
-            # Update probeTS of tuple2.
-            stprobeTS  = "%.40r" % (time())
-            st = st + tuple2 + '|' + stprobeTS + '|' + insertTS2 + '|' + flushTS2
-
-        file2.close()
-
-        # Update file2 if in stage 2.
-        if ((stage == 2) and probed):
-            file2 = open(filedescriptor2[resource].file.name, 'w')
-            file2.write(st)
-            file2.close()
+        mapping.close()
 
         return probed
 
 
+    def setProbeTS(self, table, resource, probeTS):
+        # Updates the probeTS of an RJT, and its entry in the heap of victims.
+        table[resource].setRJTProbeTS(probeTS)
+        heappush(self.victims, (probeTS, 0 if table is self.left_table else 1, resource))
+        if (len(self.victims) > 2 * (len(self.left_table) + len(self.right_table)) + 1024):
+            # Discard the outdated entries.
+            self.victims = [(tail.rjtProbeTS, side, resource)
+                            for (side, table) in enumerate((self.left_table, self.right_table))
+                            for (resource, tail) in table.iteritems()]
+            heapify(self.victims)
+
     def flushRJT(self):
         # Flush an RJT to secondary memory.
 
-        # Choose a victim from each partition (table).
-        (resource_to_flush1, tail_to_flush1, least_ts1) = self.getVictim(self.left_table)
-        (resource_to_flush2, tail_to_flush2, least_ts2) = self.getVictim(self.right_table)
+        # Choose the victim: the RJT probed least recently.
+        victim = self.getVictim()
+        if victim is None:
+            return
+        (side, resource_to_flush, tail_to_flush) = victim
 
         # Flush resource from left table.
-        if (least_ts1 <= least_ts2):
+        if (side == 0):
             file_descriptor = self.fileDescriptor_left
             table = self.left_table
-            resource_to_flush = resource_to_flush1
-            tail_to_flush = tail_to_flush1
 
         # Flush resource from right table.
-        if (least_ts2 < least_ts1):
+        else:
             file_descriptor = self.fileDescriptor_right
             table = self.right_table
-            resource_to_flush = resource_to_flush2
-            tail_to_flush = tail_to_flush2
 
 
         # Create flush timestamp.
-        flushTS = time()
+        self.timestamp += 1
+        flushTS = self.timestamp
 
         # Update file descriptor
         if (file_descriptor.has_key(resource_to_flush)):
             lentail = file_descriptor[resource_to_flush].size
-            file = open(file_descriptor[resource_to_flush].file.name, 'a')
+            file = file_descriptor[resource_to_flush].file
             file_descriptor.update({resource_to_flush: FileDescriptor(file, len(tail_to_flush.records) + lentail, flushTS)})
         else:
-            file = NamedTemporaryFile(suffix=".rjt", prefix="", delete=False)
+            file = SpillFile()
             file_descriptor.update({resource_to_flush: FileDescriptor(file, len(tail_to_flush.records), flushTS)})
 
         # Flush tail in file.
-        for record in tail_to_flush.records:
-            sttuple    = str(record.tuple)
-            stprobeTS  = "%.40r" % (record.probeTS)
-            stinsertTS = "%.40r" % (record.insertTS)
-            stflushTS  = "%.40r" % (flushTS)
-
-            file.write(sttuple + '|')
-            file.write(stprobeTS + '|')
-            file.write(stinsertTS + '|')
-            file.write(stflushTS + '\n')
-        file.close()
+        file.append(tail_to_flush.records, flushTS)
 
         # Delete resource from main memory.
         del table[resource_to_flush]
-
-
-    def getVictim(self, table):
-        # Selects a victim from a partition in main memory to flush.
-
-        resource_to_flush = ""
-        tail_to_flush = RJTTail([], 0)
-        least_ts = float("inf")
-
-        for resource, tail in table.iteritems():
-            resource_ts = tail.rjtProbeTS
-            if ((resource_ts < least_ts) or
-                (resource_ts == least_ts and len(tail.records) > len(tail_to_flush.records))):
-                resource_to_flush = resource
-                tail_to_flush = tail
-                least_ts = resource_ts
-
-        #print "Victim chosen:", resource_to_flush, "TS:", least_ts, "LEN:", len(tail_to_flush.records)
-        return (resource_to_flush, tail_to_flush, least_ts)
+        self.memory -= tail_to_flush.size
+
+
+    def getVictim(self):
+        # Selects the RJT in main memory probed least recently, as
+        # (side, resource, tail), or None if there are no RJTs.
+        tables = (self.left_table, self.right_table)
+        while self.victims:
+            (probeTS, side, resource) = heappop(self.victims)
+            tail = tables[side].get(resource)
+            # The entry is outdated if the RJT was probed again or flushed.
+            if (tail is not None) and (tail.rjtProbeTS == probeTS):
+                return (side, resource, tail)
+        return None
 
 
     def getLargestRJTs(self, i):
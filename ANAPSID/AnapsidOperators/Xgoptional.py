@@ -6,21 +6,23 @@ The intermediate results are represented as queues.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
-from time import time
+from ANAPSID.Operators.Channel import Channel, wait
 from ANAPSID.Operators.Optional import Optional
 from OperatorStructures import Record, RJTTail
+from ANAPSID.Operators.JoinKey import joinKey
 
 class Xgoptional(Optional):
 
     def __init__(self, vars_left, vars_right):
         self.left_table  = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.bag         = []
         self.vars_left   = set(vars_left)
         self.vars_right  = set(vars_right)
         self.vars        = list(self.vars_left & self.vars_right)
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars_left = self.vars_left - set(d.keys())
@@ -44,6 +46,8 @@ class Xgoptional(Optional):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((self.left, tuple1), (self.right, tuple2)) if t != "EOF"])
             # Try to get and process tuple from left queue.
             if (not(tuple1 == "EOF")):
                 try:
@@ -54,7 +58,7 @@ class Xgoptional(Optional):
                 except Exception:
                     # This catch:
                     # Empty: in tuple2 = self.right.get(False), when the queue is empty.
-                    # TypeError: in resource = resource + tuple[var], when the tuple is "EOF".
+                    # TypeError: in resource = self.key(tuple), when the tuple is "EOF".
                     pass
 
             # Try to get and process tuple from right queue.
@@ -65,7 +69,7 @@ class Xgoptional(Optional):
                 except Exception:
                     # This catch:
                     # Empty: in tuple2 = self.right.get(False), when the queue is empty.
-                    # TypeError: in resource = resource + tuple[var], when the tuple is "EOF".
+                    # TypeError: in resource = self.key(tuple), when the tuple is "EOF".
                     pass
 
         # Perform the last probes.
@@ -76,15 +80,13 @@ class Xgoptional(Optional):
         # Stage 1: While one of the sources is sending data.
 
         # Get the resource associated to the tuples.
-        resource = ''
-        for var in self.vars:
-            resource = resource + tuple[var]
+        resource = self.key(tuple)
 
         # Probe the tuple against its RJT table.
         probeTS = self.probe(tuple, resource, tuple_rjttable, vars)
 
         # Create the records.
-        record = Record(tuple, probeTS, time())
+        record = Record(tuple, probeTS, probeTS)
 
         # Insert the record in the other RJT table.
         # TODO: use RJTTail. Check ProbeTS
@@ -118,7 +120,8 @@ class Xgoptional(Optional):
         return
 
     def probe(self, tuple, resource, rjttable, vars):
-        probeTS = time()
+        self.timestamp += 1
+        probeTS = self.timestamp
         # If the resource is in table, produce results.
         if resource in rjttable:
             rjttable.get(resource).setRJTProbeTS(probeTS)
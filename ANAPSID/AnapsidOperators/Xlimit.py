@@ -6,13 +6,14 @@ The intermediate results are represented in a queue.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
+from ANAPSID.Operators.Channel import Channel
+from ANAPSID.Operators import Cancellation
 
 class Xlimit(object):
     
     def __init__(self, vars, limit):
-        self.input       = Queue()
-        self.qresults   = Queue()
+        self.input       = Channel()
+        self.qresults   = Channel()
         self.vars  = vars
         self.limit  = int(limit)
         
@@ -28,7 +29,12 @@ class Xlimit(object):
             self.qresults.put(tuple)
             count = count + 1
             #print "count", count
-            tuple = self.left.get(True)
+            if (count < self.limit):
+                tuple = self.left.get(True)
+
+        # The rest of the answer is not needed: cancel the plan.
+        if (count >= self.limit):
+            Cancellation.cancel()
             
         # Put EOF in queue and exit. 
         self.qresults.put("EOF")
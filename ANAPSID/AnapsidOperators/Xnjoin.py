@@ -6,18 +6,20 @@ The intermediate results are represented in a queue.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
-from time import time
+from ANAPSID.Operators.Channel import Channel
 from ANAPSID.Operators.Join import Join
 from OperatorStructures import Record, RJTTail
+from ANAPSID.Operators.JoinKey import joinKey
 
 class Xnjoin(Join):
 
     def __init__(self, vars):
         self.left_table  = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.vars        = vars
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars = self.vars - set(d.keys())
@@ -49,15 +51,13 @@ class Xnjoin(Join):
         # Stage 1: While one of the sources is sending data.
 
         # Get the resource associated to the tuples.
-        resource = ''
-        for var in self.vars:
-            resource = resource + tuple[var]
+        resource = self.key(tuple)
 
         # Probe the tuple against its RJT table.
         probeTS = self.probe(tuple, resource, tuple_rjttable, other_rjttable)
 
         # Create the records.
-        record = Record(tuple, probeTS, time())
+        record = Record(tuple, probeTS, probeTS)
 
         # Insert the record in the other RJT table.
         # TODO: use RJTTail. Check ProbeTS
@@ -82,7 +82,8 @@ class Xnjoin(Join):
         return
 
     def probe(self, tuple, resource, rjttable, other_rjttable):
-        probeTS = time()
+        self.timestamp += 1
+        probeTS = self.timestamp
 
         # If the resource is in table, produce results.
         if resource in rjttable:
@@ -102,7 +103,7 @@ class Xnjoin(Join):
                 instances = instances + [tuple[v]]
 
             # Contact the source.
-            qright = Queue()
+            qright = Channel()
             print "instances: "+str(instances)
             self.right.execute(self.vars, instances, qright)
 
@@ -115,7 +116,7 @@ class Xnjoin(Join):
                 self.qresults.put(rtuple_copy)
 
                 # Create and insert the record in the left RJT table.
-                record = Record(rtuple, probeTS, time())
+                record = Record(rtuple, probeTS, probeTS)
                 if resource in rjttable:
                     other_rjttable.get(resource).updateRecords(record)
                     other_rjttable.get(resource).setRJTProbeTS(probeTS)
@@ -6,20 +6,22 @@ The intermediate results are represented in a queue.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
-from time import time
+from ANAPSID.Operators.Channel import Channel
 from ANAPSID.Operators.Optional import Optional
 from OperatorStructures import Record, RJTTail
+from ANAPSID.Operators.JoinKey import joinKey
 
 class Xnoptional(Optional):
 
     def __init__(self, vars_left, vars_right):
         self.left_table  = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.vars_left   = set(vars_left)
         self.vars_right  = set(vars_right)
         self.vars        = list(self.vars_left & self.vars_right)
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars_left = self.vars_left - set(d.keys())
@@ -48,15 +50,13 @@ class Xnoptional(Optional):
         # Stage 1: While one of the sources is sending data.
 
         # Get the resource associated to the tuples.
-        resource = ''
-        for var in self.vars:
-            resource = resource + tuple[var]
+        resource = self.key(tuple)
 
         # Probe the tuple against its RJT table.
         probeTS = self.probe(tuple, resource, tuple_rjttable, other_rjttable)
 
         # Create the records.
-        record = Record(tuple, probeTS, time())
+        record = Record(tuple, probeTS, probeTS)
 
         # Insert the record in the other RJT table.
         # TODO: use RJTTail. Check ProbeTS
@@ -81,7 +81,8 @@ class Xnoptional(Optional):
 
 
     def probe(self, tuple, resource, rjttable, other_rjttable):
-        probeTS = time()
+        self.timestamp += 1
+        probeTS = self.timestamp
 
         # If the resource is in table, produce results.
         if resource in rjttable:
@@ -101,7 +102,7 @@ class Xnoptional(Optional):
                 instances = instances + [tuple[v]]
 
             # Contact the source.
-            qright = Queue()
+            qright = Channel()
             self.right.execute(self.vars, instances, qright)
 
             # Get the tuples from right queue.
@@ -115,7 +116,7 @@ class Xnoptional(Optional):
                     self.qresults.put(rtuple_copy)
 
                     # Create and insert the record in the left RJT table.
-                    record = Record(rtuple, probeTS, time())
+                    record = Record(rtuple, probeTS, probeTS)
                     if resource in rjttable:
                         other_rjttable.get(resource).updateRecords(record)
                         other_rjttable.get(resource).setRJTProbeTS(probeTS)
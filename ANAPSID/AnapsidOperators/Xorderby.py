@@ -6,93 +6,211 @@ The intermediate results are represented in a queue.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
-import datetime
-
-data_types = {
-        'integer' : (int, 'numerical'),
-        'decimal' : (float, 'numerical'),
-        'float'   : (float, 'numerical'),
-        'double'  : (float, 'numerical'),
-        'string'  : (str, str),
-        'boolean' : (bool, bool),
-        'dateTime' : (datetime, datetime),
-        'nonPositiveInteger' : (int, 'numerical'),
-        'negativeInteger' : (int, 'numerical'),
-        'long'    : (long, 'numerical'),
-        'int'     : (int, 'numerical'),
-        'short'   : (int, 'numerical'),
-        'byte'    : (bytes, bytes),
-        'nonNegativeInteger' : (int, 'numerical'),
-        'unsignedLong' : (long, 'numerical'),
-        'unsignedInt'  : (int, 'numerical'),
-        'unsignedShort' : (int, 'numerical'),
-        'unsignedByte' : (bytes, bytes), # TODO: this is not correct
-        'positiveInteger' : (int, 'numerical')
-        }
+from ANAPSID.Operators.Channel import Channel
+from ANAPSID.Operators.FilterCompiler import value, datatype, lexicalForm, isIRI
+from ANAPSID.Operators.FilterCompiler import SPARQLTypeError, numbers
+from sys import getsizeof
+from tempfile import NamedTemporaryFile
+from operator import itemgetter
+import marshal
+import heapq
+import os
+
+MEMORY_SIZE  = 256 * 1024 * 1024   # Bytes of the tuples sorted in main memory.
+MERGE_WIDTH  = 64                  # Runs merged at once, at most.
+ENTRY_SIZE   = 128                 # Bytes of an entry besides its tuple.
+SAMPLE       = 64                  # The size of every SAMPLE-th tuple is measured.
+
+
+def configure(memorySize=None):
+    # Called before the plan is executed.
+    global MEMORY_SIZE
+    if memorySize is not None:
+        MEMORY_SIZE = memorySize
+
+
+class Descending(object):
+    '''
+    Represents a value of an argument sorted in descending order.
+    It is composed by the value; its comparisons are reversed.
+    '''
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
 
 
 class Xorderby(object):
-    
-    def __init__(self, args):
-        self.input = Queue()
-        self.qresults = Queue()
+    '''
+    Sorts the tuples by the key of the arguments, extracted once per
+    tuple. The runs that exceed memorySize are sorted and flushed to
+    temporary files, and merged (MERGE_WIDTH at once) by the composite key
+    of the arguments. When only the first limit tuples are needed (a LIMIT
+    above, and the OFFSET), they are kept in a bounded heap instead. Ties
+    keep the order of arrival.
+    '''
+    def __init__(self, args, limit=-1):
+        self.input = Channel()
+        self.qresults = Channel()
         self.args = args        # List of type Argument.
+        self.limit = limit      # Tuples needed (offset+limit), or -1.
+        self.memorySize = MEMORY_SIZE
         #print "self.args", self.args
-        
+
     def execute(self, left, dummy, out):
         # Executes the Xorderby.
         self.left = left
         self.qresults = out
-        results = []
-        results_copy = []
-        
+
+        # Add results to output queue.
+        for tuple in self.sort(self.tuples()):
+            self.qresults.put(tuple)
+
+        # Put EOF in queue and exit.
+        self.qresults.put("EOF")
+        return
+
+    def tuples(self):
         # Read all the results.
         tuple = self.left.get(True)
-        #print "tuple", tuple
-        tuple_id = 0
         while (tuple != "EOF"):
-            results_copy.append(tuple)
-            res = {}
-            res.update(tuple)
-            #print "tuple", tuple
-            for arg in self.args:
-                res.update({arg.name[1:]: self.extractValue(tuple[arg.name[1:]])})
-            res.update({'__id__' : tuple_id})
-            results.append(res)
-            tuple_id = tuple_id + 1
+            yield tuple
             tuple = self.left.get(True)
-        
-        # Sorting.
-        self.args.reverse()
-        #print "en order by ",self.args
-        for arg in self.args:
-            order_by = "lambda d: (d['"+arg.name[1:]+"'])"
-            results = sorted(results, key=eval(order_by), reverse=arg.desc)
-              
-        # Add results to output queue.
-        for tuple in results: 
-            self.qresults.put(results_copy[tuple['__id__']])
-        
-        # Put EOF in queue and exit. 
-        self.qresults.put("EOF")
-        return
-    
-    def extractValue(self, val):
-        pos = val.find("^^")
 
-        # Handles when the literal is typed.
-        if (pos > -1):
-            for t in data_types.keys():
-                if (t in val[pos]):
-                    (python_type, general_type) = data_types[t]
+    def sortKey(self):
+        # Returns the key of a tuple (the values of the arguments).
+        names = [arg.name[1:] for arg in self.args]
+        if (len(names) == 1):
+            name = names[0]
+            return lambda res: sortValue(res.get(name, ''))
+        return lambda res: tuple([sortValue(res.get(n, '')) for n in names])
 
-                    if (general_type == bool):
-                        return val[:pos]
+    def sort(self, tuples):
+        # Yields the tuples in order.
+        key = self.sortKey()
+        desc = [arg.desc for arg in self.args]
+        reverse = all(desc)
+        if reverse:
+            order = lambda entry: (Descending(entry[0]), entry[1])
+        elif any(desc):
+            order = lambda entry: (tuple([Descending(v) if d else v
+                                          for (v, d) in zip(entry[0], desc)]), entry[1])
+        else:
+            order = itemgetter(0, 1)
 
-                    else:
-                        return python_type(val[:pos])
+        if (self.limit >= 0):
+            if reverse:
+                select = heapq.nlargest
+            else:
+                select = heapq.nsmallest
+                if any(desc):
+                    values = key
+                    key = lambda res: order((values(res), 0))
+            for res in select(self.limit, tuples, key=key):
+                yield res
+            return
 
-        # Handles non-typed literals.
-        else:
-            return str(val)
+        # Entries (key, seq, tuple); seq keeps the ties of the runs in
+        # arrival order when they are merged.
+        results = []
+        memory = 0
+        runs = []
+        try:
+            for (seq, res) in enumerate(tuples):
+                results.append((key(res), seq, res))
+                if (seq % SAMPLE == 0):
+                    size = ENTRY_SIZE + getsizeof(res) + sum(map(getsizeof, res.itervalues()))
+                memory += size
+                if (memory > self.memorySize):
+                    sortEntries(results, desc)
+                    runs.append(writeRun(results))
+                    results = []
+                    memory = 0
+                    if (len(runs) >= MERGE_WIDTH):
+                        runs = [writeRun(mergeRuns(runs, order))]
+            sortEntries(results, desc)
+            if not runs:
+                for entry in results:
+                    yield entry[2]
+                return
+            iterators = [readRun(name, order) for name in runs]
+            iterators.append(((order(entry), entry) for entry in results))
+            for (_, entry) in heapq.merge(*iterators):
+                yield entry[2]
+        finally:
+            for name in runs:
+                os.remove(name)
+
+
+def sortValue(term):
+    # The key of a term, as in SPARQL: unbound variables, blank nodes,
+    # IRIs, and then literals. The numbers are compared by their values;
+    # the other literals by their datatypes, and then by their values.
+    if (term == ''):
+        return (0,)
+    if term.startswith('_:'):
+        return (1, term)
+    if isIRI(term):
+        return (2, term)
+    try:
+        val = value(term)
+    except SPARQLTypeError:
+        # A typed literal whose value is not valid, e.g., "a"^^xsd:integer.
+        return (4, datatype(term), lexicalForm(term))
+    if (type(val) in numbers):
+        return (3, val)
+    return (4, datatype(term), val)
+
+def sortEntries(entries, desc):
+    # Sorts the entries by their keys. The sorts are stable, so the first
+    # argument is sorted last; it is faster than comparing the keys.
+    if (len(desc) == 1):
+        entries.sort(key=itemgetter(0), reverse=desc[0])
+        return
+    for i in reversed(xrange(len(desc))):
+        value = itemgetter(i)
+        entries.sort(key=lambda entry: value(entry[0]), reverse=desc[i])
+
+def readRun(name, order):
+    # Yields (order(entry), entry) of the entries of a run.
+    file = open(name, 'rb')
+    try:
+        while True:
+            try:
+                entry = marshal.load(file)
+            except EOFError:
+                return
+            yield (order(entry), entry)
+    finally:
+        file.close()
+
+def writeRun(entries):
+    # Writes the sorted entries to a temporary file; returns its name.
+    file = NamedTemporaryFile(suffix=".srt", prefix="", delete=False)
+    try:
+        for entry in entries:
+            marshal.dump(entry, file.file, 2)
+    finally:
+        file.close()
+    return file.name
+
+def mergeRuns(runs, order):
+    # Yields the entries of the runs in order, and removes the runs.
+    try:
+        for (_, entry) in heapq.merge(*[readRun(name, order) for name in runs]):
+            yield entry
+    finally:
+        for name in runs:
+            os.remove(name)
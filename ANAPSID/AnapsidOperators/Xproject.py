@@ -6,13 +6,13 @@ The intermediate results are represented in a queue.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
+from ANAPSID.Operators.Channel import Channel
 
 class Xproject(object):
     
     def __init__(self, vars):
-        self.input       = Queue()
-        self.qresults   = Queue()
+        self.input       = Channel()
+        self.qresults   = Channel()
         self.vars  = vars
         
     def execute(self, left, dummy, out):
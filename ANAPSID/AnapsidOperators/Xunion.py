@@ -6,7 +6,7 @@ The intermediate results are represented in a queue.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
+from ANAPSID.Operators.Channel import Channel, wait
 from Queue import Empty
 #from collections import Counter
 from ANAPSID.Operators.Union import _Union
@@ -14,9 +14,9 @@ from ANAPSID.Operators.Union import _Union
 class Xunion(_Union):
 
     def __init__(self, vars_left, vars_right):
-        self.left       = Queue()
-        self.right      = Queue()
-        self.qresults   = Queue()
+        self.left       = Channel()
+        self.right      = Channel()
+        self.qresults   = Channel()
         self.vars_left  = vars_left
         self.vars_right = vars_right
 
@@ -59,6 +59,8 @@ class Xunion(_Union):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((self.left, tuple1), (self.right, tuple2)) if t != "EOF"])
             if (not(tuple1 == "EOF")):
                 try:
                     tuple1 = self.left.get(False)
@@ -101,6 +103,8 @@ class Xunion(_Union):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((self.left, tuple1), (self.right, tuple2)) if t != "EOF"])
 
             # Get tuple from left queue, and concatenate with empty tuple.
             if (not(tuple1 == "EOF")):
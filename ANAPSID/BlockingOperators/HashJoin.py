@@ -7,9 +7,10 @@ work until all the tuples are arrived.
 
 @author: Maribel Acosta Deibe
 '''
-from time import time
+from ANAPSID.Operators.Channel import wait
 from OperatorStructures import Table, Record
 from ANAPSID.Operators.Join import Join
+from ANAPSID.Operators.JoinKey import joinKey
 
 class HashJoin(Join):
 
@@ -18,6 +19,8 @@ class HashJoin(Join):
         self.right_table = Table()
         self.results     = []
         self.vars        = vars
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars = self.vars - set(d.keys())
@@ -35,6 +38,8 @@ class HashJoin(Join):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((qleft, tuple1), (qright, tuple2)) if t != "EOF"])
             # Try to get tuple from left queue.
             if not(tuple1 == "EOF"):
                 try:
@@ -77,13 +82,11 @@ class HashJoin(Join):
         # Insert the tuple in its corresponding partition and probe.
         #print tuple
         # Get the attribute(s) to apply hash.
-        att = ''
-        for var in self.vars:
-            att = att + tuple[var]
-        i = hash(att) % table1.size;
+        i = hash(self.key(tuple)) % table1.size;
 
         # Insert record in partition.
-        record = Record(tuple, time(), 0)
+        self.timestamp += 1
+        record = Record(tuple, self.timestamp, 0)
         table1.insertRecord(i, record)
 
         # Probe the record against its partition in the other table.
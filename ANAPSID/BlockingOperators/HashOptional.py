@@ -7,9 +7,10 @@ work until all the tuples are arrived.
 
 @author: Maribel Acosta Deibe
 '''
-from time import time
+from ANAPSID.Operators.Channel import wait
 from ANAPSID.Operators.Optional import Optional
 from OperatorStructures import Table, Record
+from ANAPSID.Operators.JoinKey import joinKey
 
 class HashOptional(Optional):
 
@@ -22,6 +23,8 @@ class HashOptional(Optional):
         self.vars_left   = set(vars_left)
         self.vars_right  = set(vars_right)
         self.vars        = list(self.vars_left & self.vars_right)
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars_left = self.vars_left - set(d.keys())
@@ -41,6 +44,8 @@ class HashOptional(Optional):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((qleft, tuple1), (qright, tuple2)) if t != "EOF"])
             # Try to get tuple from left queue.
             if not(tuple1 == "EOF"):
                 try:
@@ -94,13 +99,11 @@ class HashOptional(Optional):
         # Insert the tuple in its corresponding partition and probe.
 
         # Get the attribute(s) to apply hash.
-        att = ''
-        for var in self.vars:
-            att = att + tuple[var]
-        i = hash(att) % table1.size;
+        i = hash(self.key(tuple)) % table1.size;
 
         # Insert record in partition.
-        record = Record(tuple, time(), 0)
+        self.timestamp += 1
+        record = Record(tuple, self.timestamp, 0)
         table1.insertRecord(i, record)
 
         # Probe the record against its partition in the other table.
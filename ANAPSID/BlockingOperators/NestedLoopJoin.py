@@ -6,10 +6,10 @@ The intermediate results are represented as lists.
 
 @author: Maribel Acosta Deibe
 '''
-from time import time
-from multiprocessing import Queue
+from ANAPSID.Operators.Channel import Channel
 from ANAPSID.Operators.Join import Join
 from OperatorStructures import Table, Partition, Record
+from ANAPSID.Operators.JoinKey import joinKey
 
 class NestedLoopJoin(Join):
 
@@ -18,6 +18,8 @@ class NestedLoopJoin(Join):
         self.right_table = Table()
         self.results     = []
         self.vars        = vars
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def execute(self, qleft, qright, out):
         # Executes the Nested Loop Join.
@@ -51,13 +53,11 @@ class NestedLoopJoin(Join):
         # Executes the Nested Loop Join.
 
         # Get the attribute(s) to apply hash.
-        att1 = ''
-        for var in self.vars:
-            att1 = att1 + tuple[var]
-        i = hash(att1) % self.left_table.size;
+        i = hash(self.key(tuple)) % self.left_table.size;
 
         # Create record (tuple, ats, dts).
-        record = Record(tuple, time(), 0)
+        self.timestamp += 1
+        record = Record(tuple, self.timestamp, 0)
 
         # Insert record in its corresponding partition.
         self.left_table.insertRecord(i, record)
@@ -99,7 +99,7 @@ class NestedLoopJoin(Join):
                     instances = instances + [record.tuple[v]]
 
                 # Contact the source.
-                qright = Queue()
+                qright = Channel()
                 right.execute(self.vars, instances, qright)
 
                 # Insert in right table, and produce the results.
@@ -110,7 +110,8 @@ class NestedLoopJoin(Join):
                     for v in var:
                         res2.update({v:record.tuple[v]})
 
-                    reg = Record(res2, time(), 0)
+                    self.timestamp += 1
+                    reg = Record(res2, self.timestamp, 0)
                     self.right_table.insertRecord(i, reg)
 
                     res = rtuple.copy()
@@ -6,10 +6,10 @@ The intermediate results are represented as lists.
 
 @author: Maribel Acosta Deibe
 '''
-from time import time
-from multiprocessing import Queue
+from ANAPSID.Operators.Channel import Channel
 from ANAPSID.Operators.Optional import Optional
 from OperatorStructures import Table, Partition, Record
+from ANAPSID.Operators.JoinKey import joinKey
 
 class NestedLoopOptional(Optional):
 
@@ -20,6 +20,8 @@ class NestedLoopOptional(Optional):
         self.vars_left   = set(vars_left)
         self.vars_right  = set(vars_right)
         self.vars        = list(self.vars_left & self.vars_right)
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars_left = self.vars_left - set(d.keys())
@@ -58,13 +60,11 @@ class NestedLoopOptional(Optional):
         # Executes the Nested Loop Join.
 
         # Get the attribute(s) to apply hash.
-        att1 = ''
-        for var in self.vars:
-            att1 = att1 + tuple[var]
-        i = hash(att1) % self.left_table.size;
+        i = hash(self.key(tuple)) % self.left_table.size;
 
         # Create record (tuple, ats, dts).
-        record = Record(tuple, time(), 0)
+        self.timestamp += 1
+        record = Record(tuple, self.timestamp, 0)
 
         # Insert record in its corresponding partition.
         self.left_table.insertRecord(i, record)
@@ -107,7 +107,7 @@ class NestedLoopOptional(Optional):
                     instances = instances + [record.tuple[v]]
 
                 # Contact the source.
-                qright = Queue()
+                qright = Channel()
                 right.execute(self.vars, instances, qright)
 
 
@@ -122,7 +122,8 @@ class NestedLoopOptional(Optional):
                         for v in var:
                             res2.update({v:record.tuple[v]})
 
-                        reg = Record(res2, time(), 0)
+                        self.timestamp += 1
+                        reg = Record(res2, self.timestamp, 0)
                         self.right_table.insertRecord(i, reg)
 
                         res = rtuple.copy()
@@ -139,7 +140,8 @@ class NestedLoopOptional(Optional):
                     for k in self.right.atts:
                         res.update({k:''})
 
-                    reg = Record(res, time(), 0)
+                    self.timestamp += 1
+                    reg = Record(res, self.timestamp, 0)
                     self.right_table.insertRecord(i, reg)
 
                     res.update(record.tuple)
@@ -12,6 +12,8 @@ class Record(object):
     It is composed by a tuple, ats (arrival timestamp) and
     dts (departure timestamp).
     '''
+    __slots__ = ('tuple', 'ats', 'dts')
+
     def __init__(self, tuple, ats, dts):
         self.tuple = tuple
         self.ats = ats
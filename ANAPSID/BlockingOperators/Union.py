@@ -7,6 +7,7 @@ The intermediate results are represented as lists.
 @author: Maribel Acosta Deibe
 '''
 import itertools
+from ANAPSID.Operators.Channel import wait
 from ANAPSID.Operators.Union import _Union
 
 class Union(_Union):
@@ -36,6 +37,8 @@ class Union(_Union):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((qleft, tuple1), (qright, tuple2)) if t != "EOF"])
             # Try to get tuple from left queue.
             if not(tuple1 == "EOF"):
                 try:
@@ -0,0 +1,37 @@
+'''
+Created on Oct 18, 2026
+
+Keeps the options given to every endpoint in the endpoint description
+file, e.g.:
+
+  <http://example.org/sparql> [prefetch=4] <http://...#type> ... .
+
+The options are registered when the description file is parsed, before
+the plan is executed, so every process of the plan can read them.
+
+Known options:
+  prefetch  -- number of LIMIT/OFFSET pages requested in parallel
+               (bounded by the size of the connection pool).
+  values    -- no if the endpoint rejects SPARQL 1.1 VALUES; the nested
+               joins then send the values of the left tuples in a FILTER.
+'''
+
+options = dict()
+
+def setOptions(endpoint, opts):
+    # 'endpoint' is the URL of the endpoint, with or without '<' '>'.
+    options[endpoint.strip('<>')] = opts
+
+def getOption(endpoint, name, default=None):
+    return options.get(endpoint.strip('<>'), {}).get(name, default)
+
+def parseOption(option):
+    # Parses an option of the form [name=value]. Returns (name, value).
+    (name, value) = option.strip('[]').split('=', 1)
+    if value.isdigit():
+        value = int(value)
+    elif value.lower() in ('yes', 'true'):
+        value = True
+    elif value.lower() in ('no', 'false'):
+        value = False
+    return (name, value)
@@ -0,0 +1,151 @@
+'''
+Created on Oct 18, 2026
+
+Implements a persistent cache of the ASK queries sent during the
+source selection.
+
+The answers are indexed by the endpoint and the canonical form of the
+triple patterns: prefixes are expanded, the triple patterns are sorted
+and the variables are renamed in order of appearance, so the same ASK
+is recognized within a query and across queries. Every answer expires
+after TTL seconds.
+
+The cache is loaded from CACHE_FILE the first time it is used, and the
+new answers are written back at the end of the source selection. Other
+cache files can be loaded beforehand (warmUp), e.g., the file obtained
+by running the source selection of a whole workload.
+
+The ASKs sent and the ASKs answered by the cache for every query are
+logged in .askcache.log.
+'''
+import os
+import json
+import fcntl
+import logging
+from tempfile import mkstemp
+from time import time
+from utils import getUri, test as ask
+
+ENABLED    = True
+CACHE_FILE = '.askcache.json'
+TTL        = 7 * 24 * 3600   # Seconds an answer is valid.
+
+entries = None               # key -> [answer, expires]
+changed = {}                 # Answers obtained since the cache was loaded.
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.FileHandler('.askcache.log')
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+def configure(enabled=None, cacheFile=None, ttl=None):
+    global ENABLED, CACHE_FILE, TTL, entries
+    if enabled is not None:
+        ENABLED = enabled
+    if cacheFile is not None:
+        CACHE_FILE = cacheFile
+        entries = None
+    if ttl is not None:
+        TTL = ttl
+
+def canonical(triples, ps):
+    # The form of the triple patterns that does not depend on their order,
+    # on the names of the variables, nor on the prefixes.
+    def shape(t):
+        return tuple(getUri(a, ps) if a.constant else '?' for a in (t.subject, t.predicate, t.theobject))
+    names = {}
+    parts = []
+    for t in sorted(triples, key=shape):
+        for a in (t.subject, t.predicate, t.theobject):
+            if a.constant:
+                parts.append(getUri(a, ps))
+            else:
+                if not (a.name in names):
+                    names[a.name] = '?v' + str(len(names))
+                parts.append(names[a.name])
+        parts.append('.')
+    return ' '.join(parts)
+
+def key(endpoint, triples, ps):
+    return endpoint + ' ' + canonical(triples, ps)
+
+def readFile(fileName):
+    # Returns the answers of the file that have not expired.
+    try:
+        with open(fileName, 'r') as f:
+            es = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    now = time()
+    return dict((k, v) for (k, v) in es.iteritems() if v[1] > now)
+
+def load():
+    global entries
+    if entries is None:
+        entries = readFile(CACHE_FILE)
+    return entries
+
+def warmUp(fileName):
+    # Adds the answers of another cache file, without replacing newer ones.
+    es = load()
+    for (k, v) in readFile(fileName).iteritems():
+        if (not (k in es)) or (es[k][1] < v[1]):
+            es[k] = v
+            changed[k] = v
+
+def lookup(endpoint, triples, ps):
+    # Returns the cached answer (True or False), or None.
+    if not ENABLED:
+        return None
+    v = load().get(key(endpoint, triples, ps), None)
+    if (v is None) or (v[1] <= time()):
+        return None
+    return v[0]
+
+def store(endpoint, triples, ps, answer):
+    if not ENABLED or not isinstance(answer, bool):
+        # Failed ASKs (no answer) are asked again the next time.
+        return
+    v = [answer, time() + TTL]
+    k = key(endpoint, triples, ps)
+    load()[k] = v
+    changed[k] = v
+
+def test(endpoint, triples, ps, c):
+    # Like utils.test, but answered by the cache when possible.
+    # Returns the answer and whether it was a hit.
+    b = lookup(endpoint, triples, ps)
+    if b is not None:
+        return (b, True)
+    b = ask(endpoint, triples, ps, c)
+    store(endpoint, triples, ps, b)
+    return (b, False)
+
+def logStats(asks, hits):
+    # Called at the end of the source selection of a query.
+    logger.info(str(asks) + " ASKs sent, " + str(hits) + " answered by the cache")
+
+def save():
+    # Writes the new answers. The file is locked while it is updated and
+    # replaced atomically, so concurrent executions do not lose answers.
+    global changed
+    if not ENABLED or not changed:
+        return
+    lock = open(CACHE_FILE + '.lock', 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        es = readFile(CACHE_FILE)
+        es.update(changed)
+        directory = os.path.dirname(os.path.abspath(CACHE_FILE))
+        (fd, name) = mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(es, f, indent=0, sort_keys=True)
+        os.rename(name, CACHE_FILE)
+        changed = {}
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
@@ -0,0 +1,116 @@
+'''
+Created on Oct 18, 2026
+
+Implements the concurrent probing of endpoints with ASK queries during
+the source selection.
+
+probe() receives the ASK queries that the source selection needs for a
+triple pattern, answers from the ASK cache the ones it can, and sends
+the rest at the same time, at most MAX_PER_ENDPOINT to the same
+endpoint. The answers are returned in the order of the queries, so the
+decisions of the source selection are the same as if the ASK queries
+were sent one by one.
+
+An ASK query not answered within TIMEOUT seconds is considered
+positive: the endpoint stays as a candidate, as the decision of
+discarding it can not be taken. Such answers are not cached.
+'''
+from threading import Thread, BoundedSemaphore
+from time import time
+from utils import test as ask, search
+import askCache
+
+ENABLED          = True
+MAX_PER_ENDPOINT = 4      # ASK queries sent at the same time to an endpoint.
+TIMEOUT          = 30     # Seconds to wait for the answers of a probe.
+PREFETCH_BGP     = False  # Probe the triple patterns of the whole BGP at once.
+
+
+def configure(enabled=None, maxPerEndpoint=None, timeout=None, prefetchBGP=None):
+    global ENABLED, MAX_PER_ENDPOINT, TIMEOUT, PREFETCH_BGP
+    if enabled is not None:
+        ENABLED = enabled
+    if maxPerEndpoint is not None:
+        MAX_PER_ENDPOINT = maxPerEndpoint
+    if timeout is not None:
+        TIMEOUT = timeout
+    if prefetchBGP is not None:
+        PREFETCH_BGP = prefetchBGP
+
+
+class Ask(Thread):
+    '''
+    Sends one ASK query in its own thread. The slots of the endpoint
+    bound the number of ASK queries sent at the same time to it.
+    '''
+    def __init__(self, endpoint, triples, ps, c, slots):
+        Thread.__init__(self)
+        self.daemon = True
+        self.args = (endpoint, triples, ps, c)
+        self.slots = slots
+        self.answer = None
+
+    def run(self):
+        self.slots.acquire()
+        try:
+            self.answer = ask(*self.args)
+        except Exception:
+            # A failed ASK is a negative answer, as in the serial source selection.
+            self.answer = None
+        finally:
+            self.slots.release()
+
+
+def probe(asks, ps, c):
+    # Receives a list of (endpoint, triples) and returns the list of
+    # (answer, hit), where hit tells whether it was answered by the cache.
+    if not ENABLED:
+        return [askCache.test(ep, nl, ps, c) for (ep, nl) in asks]
+
+    results = [None] * len(asks)
+    pending = {}    # key -> (thread, positions)
+    slots = {}
+    for (i, (ep, nl)) in enumerate(asks):
+        k = askCache.key(ep, nl, ps)
+        if k in pending:
+            # The same ASK twice: the second one is a hit, as in the serial algorithm.
+            pending[k][1].append(i)
+            continue
+        b = askCache.lookup(ep, nl, ps)
+        if b is not None:
+            results[i] = (b, True)
+            continue
+        if not (ep in slots):
+            slots[ep] = BoundedSemaphore(MAX_PER_ENDPOINT)
+        t = Ask(ep, nl, ps, c, slots[ep])
+        t.start()
+        pending[k] = (t, [i])
+
+    deadline = time() + TIMEOUT
+    for (t, positions) in pending.values():
+        t.join(max(deadline - time(), 0))
+        (ep, nl, _, _) = t.args
+        if t.is_alive():
+            b = True
+        else:
+            b = t.answer
+            askCache.store(ep, nl, ps, b)
+        results[positions[0]] = (b, False)
+        for i in positions[1:]:
+            results[i] = (b, True)
+    return results
+
+def prefetch(l, triples, prefixes, c):
+    # Probes the endpoints that provide the predicate of every triple
+    # pattern with a constant, so the source selection of the BGP finds
+    # the answers in the cache. Returns the number of ASK queries sent.
+    if not (ENABLED and PREFETCH_BGP and askCache.ENABLED):
+        return 0
+    asks = []
+    for t in triples:
+        if not (t.subject.constant or t.predicate.constant or t.theobject.constant):
+            continue
+        eps = search(l, t.predicate, prefixes)
+        if len(eps) > 1:
+            asks.extend([(ep, [t]) for ep in eps])
+    return len([hit for (b, hit) in probe(asks, prefixes, c) if not hit])
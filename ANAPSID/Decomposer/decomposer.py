@@ -8,9 +8,12 @@ import urllib
 import socket
 import parseEndpoints, parseQuery, parseQuery1_1, services
 import Tree
+import askCache
+import askProbe
 from itertools import combinations, permutations
 from multiprocessing import Queue
 from ANAPSID.Planner.Plan import contactProxy
+from ANAPSID.Planner import ConnectionPool
 from Tree import Node, Leaf
 from utils import *
 from services import Service, Argument, Triple, Filter, Optional, UnionBlock, JoinBlock, Query
@@ -462,6 +465,7 @@ def assignEndpointS(tl, l, genPred, prefixes, c, printAsk, printSourceSelection)
         elif len(ps) > 1:
             eps = ps
 
+    prefetchAsks(l, ts, prefixes, c, printAsk)
     for sg in ts:
         ps = search(l, sg.predicate, prefixes)
         eps0 = ps
@@ -521,6 +525,7 @@ def assignEndpointM(tl, l, genPred, prefixes, c, printAsk, printSourceSelection)
             qcl0[p].append(sg)
             ts.remove(sg)
             continue
+    prefetchAsks(l, ts, prefixes, c, printAsk)
     for sg in ts:
         ps = search(l, sg.predicate, prefixes)
         eps0 = ps
@@ -557,37 +562,61 @@ def assignEndpointM(tl, l, genPred, prefixes, c, printAsk, printSourceSelection)
     #print(qcl0, qcl1)
     return (qcl0, qcl1)
 
+def prefetchAsks(l, tl, prefixes, c, printAsk):
+    # Sends at once the ASKs of the triple patterns of the BGP (if enabled).
+    nbAsk = askProbe.prefetch(l, tl, prefixes, c)
+    if nbAsk > 0:
+        with open(printAsk, 'a') as pa:
+            pa.write('+'+str(nbAsk))
+
 def selectCurrentBest(options, triple, qcl, ps, genPred, c, printAsk, printSourceSelection):
 
     added = False
     currentOptions = []
     nbAsk = 0
+    nbHits = 0
     sourceSelection = []
+    # The ASKs of each stage are sent at the same time, and their answers
+    # are considered in the same order as in the serial algorithm.
+    asks = []
     for ep in qcl:
        if ep in options:
            nl = list(qcl[ep])
            if shareWithAny(triple, nl):
                nl.append(triple)
-               if test(ep, nl, ps, c):
-                   currentOptions.append(ep)
-                   added = True
-                   sourceSelection.append([ep, nl])
-               nbAsk=+1
+               asks.append((ep, nl))
+    for ((ep, nl), (b, hit)) in zip(asks, askProbe.probe(asks, ps, c)):
+        if b:
+            currentOptions.append(ep)
+            added = True
+            sourceSelection.append([ep, nl])
+        if hit:
+            nbHits+=1
+        else:
+            nbAsk+=1
     if not added or not (getUri(triple.predicate, ps) in genPred or not triple.predicate.constant):
+        asks = []
         for ep in options:
             nl = [triple]
             #Avoid ask's of non-instantiated triple patterns
-            if not(triple.subject.constant or triple.predicate.constant or triple.theobject.constant) and not ep in currentOptions:
-                #    print triple.subject.name, triple.predicate.name, triple.theobject.name
+            if not(triple.subject.constant or triple.predicate.constant or triple.theobject.constant):
+                if not ep in currentOptions:
+                    #    print triple.subject.name, triple.predicate.name, triple.theobject.name
+                    currentOptions.append(ep)
+            else:
+                asks.append((ep, nl))
+        for ((ep, nl), (b, hit)) in zip(asks, askProbe.probe(asks, ps, c)):
+            if b and not ep in currentOptions:
+                #print "yes"
                 currentOptions.append(ep)
+                sourceSelection.append([ep, nl])
+            if hit:
+                nbHits+=1
             else:
-                if test(ep, nl, ps, c) and not ep in currentOptions:
-                    #print "yes"
-                    currentOptions.append(ep)
-                    sourceSelection.append([ep, nl])
                 nbAsk+=1
+    # ASKs sent to the endpoints are written as +n, and cache hits as *n.
     with open(printAsk, 'a') as pa:
-        pa.write('+'+str(nbAsk))
+        pa.write('+'+str(nbAsk)+'*'+str(nbHits))
     with open(printSourceSelection, 'a') as pss:
         pss.write('+'+str(sourceSelection)+'\n')
     return currentOptions
@@ -871,6 +900,8 @@ def decompose(qString, eFile, decomposition, contact, printAsk, printSourceSelec
     sst2 = time() - sst1
     with open(printSourceSelectionTime, 'w+') as psst:
         psst.write(str(sst2))
+    ConnectionPool.logStats()
+    askCache.save()
 
     if groups == None:
         return None
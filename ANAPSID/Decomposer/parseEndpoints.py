@@ -1,4 +1,5 @@
 from ply import lex, yacc
+from ANAPSID.Catalog import EndpointOptions
 #from services import Argument
 
 # Lexer
@@ -7,12 +8,14 @@ tokens = (
     "PRED0",
     "PRED1",
     "URI",
+    "OPTION",
     "POINT"
 )
 
 t_PRED0 = r"[a-z](\S)*"+":"+r"[a-z](\S)*"
 t_PRED1 = r"[a-z](\S)*"+":"+r"<"+"\S+"+r">"
 t_URI = r"<"+"\S+"+r">"
+t_OPTION = r"\["+r"[a-zA-Z_]+="+r"[^\]\s]*"+r"\]"
 t_POINT= r"\."
 
 t_ignore = ' \t\n'
@@ -46,7 +49,28 @@ def p_endpoint(p):
     """
     endpoint : URI predicate_list POINT
     """
-    p[0] = (p[1], p[2])
+    p[0] = (p[1], p[2], {})
+
+def p_endpoint_options(p):
+    """
+    endpoint : URI options_list predicate_list POINT
+    """
+    p[0] = (p[1], p[3], p[2])
+
+def p_options_list(p):
+    """
+    options_list : options_list OPTION
+    """
+    (name, value) = EndpointOptions.parseOption(p[2])
+    p[1][name] = value
+    p[0] = p[1]
+
+def p_single_options_list(p):
+    """
+    options_list : OPTION
+    """
+    (name, value) = EndpointOptions.parseOption(p[1])
+    p[0] = {name : value}
 
 def p_predicate_list(p):
     """
@@ -86,4 +110,9 @@ parser = yacc.yacc(debug=0)
 # Helpers
 
 def parse(file):
-    return parser.parse(file.read(), lexer=lexer)
+    # Returns the list of (endpoint, predicates) and registers the
+    # options of every endpoint.
+    endpoints = parser.parse(file.read(), lexer=lexer)
+    for (e, ps, opts) in endpoints:
+        EndpointOptions.setOptions(e, opts)
+    return [(e, ps) for (e, ps, opts) in endpoints]
@@ -0,0 +1,200 @@
+'''
+Created on Oct 18, 2026
+
+Implements the instantiations of the right operator of the nested
+operators with filter (NestedHashJoinFilter, NestedHashOptionalFilter),
+with the values of the join variables of a bag of left tuples.
+
+The values are given in a SPARQL 1.1 VALUES block,
+
+  VALUES (?x ?y) { (<a> "b") (<c> "d") ... }
+
+that the endpoints join with the subquery, so a subquery carries up to
+VALUES_WINDOW_SIZE left tuples; the long subqueries are sent by POST.
+The endpoints that reject VALUES are marked with [values=no] in the
+endpoint description, and receive a FILTER of up to WINDOW_SIZE left
+tuples,
+
+  FILTER ((?x = <a> && ?y = "b") || (?x = <c> && ?y = "d") ...)
+
+The number of left tuples of an instantiation (the window) is chosen by
+a WindowController per operator, as the page sizes (PageSize): the
+first windows are small, and the window is doubled while the throughput
+(left tuples per second) of the instantiations improves, it is halved
+when an instantiation takes longer than TARGET_LATENCY, and it is
+bounded so an instantiation produces about MAX_ANSWERS answers. A window
+that is not full is sent anyway when its first tuple has waited DEADLINE
+seconds.
+'''
+from __future__ import division
+from ANAPSID.Catalog import EndpointOptions
+from ANAPSID.Operators.Clock import monotonic
+from ANAPSID.Operators.FilterCompiler import isIRI, languageLiteral, lexicalForm, lang, datatype
+
+WINDOW_SIZE        = 10     # Left tuples per FILTER, at most.
+VALUES_WINDOW_SIZE = 200    # Left tuples per VALUES block, at most.
+FIRST_WINDOW_SIZE  = 10
+TARGET_LATENCY     = 5.0    # Windows are shrunk if they take longer (secs).
+IMPROVEMENT        = 1.1    # Throughput gain needed to keep growing.
+MAX_ANSWERS        = 10000  # Answers expected from an instantiation, at most.
+DEADLINE           = 0.1    # Seconds a left tuple waits for its window to fill.
+USE_VALUES         = True
+ADAPTIVE           = True
+
+
+def configure(values=None, valuesWindowSize=None, deadline=None, adaptive=None):
+    # Called before the plan is executed.
+    global USE_VALUES, VALUES_WINDOW_SIZE, DEADLINE, ADAPTIVE
+    if values is not None:
+        USE_VALUES = values
+    if valuesWindowSize is not None:
+        VALUES_WINDOW_SIZE = valuesWindowSize
+    if deadline is not None:
+        DEADLINE = deadline
+    if adaptive is not None:
+        ADAPTIVE = adaptive
+
+
+class WindowController(object):
+    '''
+    Chooses the windows of the instantiations of the right operator of
+    one nested operator. It is composed by the largest window, the
+    current window, whether it is still growing, the best throughput of
+    every window, the answers per left tuple, and the instantiations
+    being evaluated (size, start, answers).
+    '''
+    def __init__(self, operator):
+        if acceptsValues(operator):
+            self.maxSize = VALUES_WINDOW_SIZE
+        else:
+            self.maxSize = WINDOW_SIZE
+        self.adaptive    = ADAPTIVE
+        self.growing     = True
+        self.throughputs = {}
+        self.answers     = None     # Average answers per left tuple.
+        self.pending     = {}
+        self.size        = self.bound(FIRST_WINDOW_SIZE)
+        if not self.adaptive:
+            self.size = self.maxSize
+
+    def bound(self, size):
+        size = max(min(size, self.maxSize), 1)
+        if self.answers:
+            size = max(min(size, int(MAX_ANSWERS / self.answers)), 1)
+        return size
+
+    def sent(self, instance, size):
+        # An instantiation of size left tuples was started.
+        self.pending[instance] = [size, monotonic(), 0]
+
+    def received(self, instance):
+        # An answer of the instantiation arrived.
+        self.pending[instance][2] += 1
+
+    def finished(self, instance):
+        # The instantiation sent all its answers.
+        (size, start, answers) = self.pending.pop(instance)
+        self.observe(size, answers, monotonic() - start)
+
+    def observe(self, size, answers, elapsed):
+        # Feedback of an instantiation that was entirely received.
+        if not self.adaptive or (elapsed <= 0):
+            return
+        if self.answers is None:
+            self.answers = answers / size
+        else:
+            self.answers = 0.8 * self.answers + 0.2 * answers / size
+        if elapsed >= TARGET_LATENCY:
+            self.size = self.bound(size // 2)
+            self.growing = False
+            return
+        if (size != self.size):
+            # Windows sent at the deadline, or before the last decision,
+            # do not tell the throughput of the current window.
+            self.size = self.bound(self.size)
+            return
+        throughput = size / elapsed
+        self.throughputs[size] = max(throughput, self.throughputs.get(size, 0))
+        if self.growing:
+            previous = self.throughputs.get(size // 2, None)
+            if (previous is None) or (throughput >= previous * IMPROVEMENT):
+                self.size = self.bound(size * 2)
+            else:
+                # Larger windows do not pay off: keep the best one measured.
+                self.growing = False
+                best = max(self.throughputs.values())
+                self.size = self.bound(min([s for s in self.throughputs
+                                            if self.throughputs[s] == best]))
+        else:
+            self.size = self.bound(self.size)
+
+    def full(self, bag, since):
+        # True if the bag, whose first tuple arrived at since, must be sent.
+        return (len(bag) >= self.size) or (monotonic() - since >= DEADLINE)
+
+    def timeout(self, since):
+        # Seconds until the bag whose first tuple arrived at since is due.
+        return max(0, since + DEADLINE - monotonic())
+
+
+def endpoints(operator):
+    # Returns the endpoints contacted by the operator (a leaf or a plan).
+    if hasattr(operator, 'server'):
+        return [operator.server]
+    es = []
+    for child in (getattr(operator, 'left', None), getattr(operator, 'right', None)):
+        if child is not None:
+            es.extend(endpoints(child))
+    return es
+
+def acceptsValues(operator):
+    # True if every endpoint contacted by the operator accepts VALUES.
+    if not USE_VALUES:
+        return False
+    for e in endpoints(operator):
+        if not EndpointOptions.getOption(e, 'values', True):
+            return False
+    return True
+
+def term(v):
+    # uris must be passed between < .. >
+    if isIRI(v):
+        return "<" + v + ">"
+    # literals keep their language tag or their datatype
+    if languageLiteral(v):
+        return quote(lexicalForm(v)) + '@' + lang(v)
+    if ('^^<' in v):
+        return quote(lexicalForm(v)) + '^^<' + datatype(v) + '>'
+    return quote(v)
+
+def quote(lexical):
+    return '"' + lexical.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def filterExpression(vars, bag):
+    or_expr = []
+    for tuple in bag:
+        and_expr = ["?" + var + "=" + term(tuple[var]) for var in vars]
+        or_expr.append('(' + ' && '.join(and_expr) + ')')
+    return ' . FILTER (' + ' || '.join(or_expr) + ')'
+
+def valuesBlock(vars, bag):
+    rows = []
+    seen = set()
+    for tuple in bag:
+        row = '(' + ' '.join([term(tuple[var]) for var in vars]) + ')'
+        if row not in seen:
+            seen.add(row)
+            rows.append(row)
+    return (' . VALUES (' + ' '.join(['?' + var for var in vars]) + ') { '
+            + ' '.join(rows) + ' }')
+
+def makeInstantiation(vars, bag, operator):
+    # Returns the operator restricted to the values of the bag.
+    vars = sorted(vars)
+    if not vars:
+        filter_str = ''
+    elif acceptsValues(operator):
+        filter_str = valuesBlock(vars, bag)
+    else:
+        filter_str = filterExpression(vars, bag)
+    return operator.instantiateFilter(set(['?' + v for v in vars]), filter_str)
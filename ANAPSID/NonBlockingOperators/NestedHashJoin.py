@@ -8,13 +8,14 @@ Autor: Gabriela Montoya
 Date: July 18th, 2012
 
 '''
-from multiprocessing import Queue, Process
-from time import time
+from multiprocessing import Process
+from ANAPSID.Operators.Channel import Channel, wait
 import string, sys
 from Queue import Empty
 from ANAPSID.Operators.Join import Join
 from ANAPSID.Decomposer.Tree import Leaf, Node
 from OperatorStructures import Table, Partition, Record
+from ANAPSID.Operators.JoinKey import joinKey
 
 
 class NestedHashJoin(Join):
@@ -22,8 +23,10 @@ class NestedHashJoin(Join):
     def __init__(self, vars):
         self.left_table = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.vars        = vars
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
         
 
     def instantiate(self, d):
@@ -41,14 +44,17 @@ class NestedHashJoin(Join):
         right_queues = dict()
 
         while (not(tuple1 == "EOF") or (len(right_queues) > 0)):
+            # Sleep until the left queue, if it has not ended, or a right queue has a tuple.
+            wait(([self.left_queue] if tuple1 != "EOF" else []) + right_queues.values())
 
             # Try to get and process tuple from left queue
             if not(tuple1 == "EOF"):
                 try:
                     tuple1 = self.left_queue.get(False)
                     #print "tuple1: "+str(tuple1)
+                    self.timestamp += 1
                     instance = self.probeAndInsert1(tuple1, self.right_table,
-                                                    self.left_table, time())
+                                                    self.left_table, self.timestamp)
                     if instance: # the join variables have not been used to
                                  # instanciate the right_operator
 
@@ -56,17 +62,17 @@ class NestedHashJoin(Join):
                                                                     self.right_operator)
                         #print "new op: "+str(new_right_operator)
                         resource = self.getResource(tuple1)
-                        queue = Queue()
+                        queue = Channel()
                         right_queues[resource] = queue
                         #print "new_right_operator.__class__", new_right_operator.__class__
                         #print "new_right_operator.left.__class__", new_right_operator.left.__class__
-                        new_right_operator.execute(queue)
+                        new_right_operator.execute(queue, False)
                         #p2 = Process(target=new_right_operator.execute, args=(queue,))
                         #p2.start()
                 except Empty:
                     pass
                 except TypeError:
-                    # TypeError: in resource = resource + tuple[var], when the tuple is "EOF".
+                    # TypeError: in resource = self.key(tuple), when the tuple is "EOF".
                     pass
                 except Exception as e:
                     #print "Unexpected error:", sys.exc_info()[0]
@@ -83,8 +89,9 @@ class NestedHashJoin(Join):
                     if (tuple2 == "EOF"):
                         toRemove.append(r)
                     else:
+                        self.timestamp += 1
                         self.probeAndInsert2(r, tuple2, self.left_table,
-                                             self.right_table, time())
+                                             self.right_table, self.timestamp)
                 except Exception:
                     # This catch:
                     # Empty: in tuple2 = self.right.get(False), when the queue is empty.
@@ -99,10 +106,7 @@ class NestedHashJoin(Join):
         return
 
     def getResource(self, tuple):
-        resource = ''
-        for var in self.vars:
-            resource = resource + tuple[var]
-        return resource
+        return self.key(tuple)
 
     def makeInstantiation(self, tuple, operator):
         d = {}
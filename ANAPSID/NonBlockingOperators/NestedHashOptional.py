@@ -9,23 +9,26 @@ Date: November 18th, 2013
 
 '''
 from OperatorStructures import Table, Partition, Record
-from multiprocessing import Queue, Process
-from time import time
+from multiprocessing import Process
+from ANAPSID.Operators.Channel import Channel, wait
 from ANAPSID.Decomposer.Tree import Leaf, Node
 import string, sys
 from Queue import Empty
 from ANAPSID.Operators.Optional import Optional
+from ANAPSID.Operators.JoinKey import joinKey
 
 class NestedHashOptional(Optional):
 
     def __init__(self, vars_left, vars_right):
         self.left_table = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.bag         = []
         self.vars_left   = set(vars_left)
         self.vars_right  = set(vars_right)
         self.vars        = list(self.vars_left & self.vars_right)
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
 
     def instantiate(self, d):
@@ -45,6 +48,8 @@ class NestedHashOptional(Optional):
         right_queues = dict()
 
         while (not(tuple1 == "EOF") or (len(right_queues) > 0)):
+            # Sleep until the left queue, if it has not ended, or a right queue has a tuple.
+            wait(([self.left_queue] if tuple1 != "EOF" else []) + right_queues.values())
             
             # Try to get and process tuple from left queue
             if not(tuple1 == "EOF"):
@@ -53,8 +58,9 @@ class NestedHashOptional(Optional):
                     if not(tuple1 == "EOF"):
                         self.bag.append(tuple1)
                     #print "tuple1: "+str(tuple1)
+                    self.timestamp += 1
                     instance = self.probeAndInsert1(tuple1, self.right_table, 
-                                                    self.left_table, time())
+                                                    self.left_table, self.timestamp)
                     #print "instance:", instance
                     if instance: # the join variables have not been used to 
                                  # instanciate the right_operator
@@ -63,17 +69,17 @@ class NestedHashOptional(Optional):
                                                                     self.right_operator)
                         #print "new op: "+str(new_right_operator)
                         resource = self.getResource(tuple1)
-                        queue = Queue()
+                        queue = Channel()
                         right_queues[resource] = queue
                         #print "new_right_operator.__class__", new_right_operator.__class__
                         #print "new_right_operator.left.__class__", new_right_operator.left.__class__
-                        new_right_operator.execute(queue)
+                        new_right_operator.execute(queue, False)
                         #p2 = Process(target=new_right_operator.execute, args=(queue,))
                         #p2.start()
                 except Empty:
                     pass 
                 except TypeError:
-                    # TypeError: in resource = resource + tuple[var], when the tuple is "EOF".
+                    # TypeError: in resource = self.key(tuple), when the tuple is "EOF".
                     pass
                 except:
                     #print "Unexpected error:", sys.exc_info()[0]
@@ -89,8 +95,9 @@ class NestedHashOptional(Optional):
                     if (tuple2 == "EOF"):
                         toRemove.append(r)
                     else:
+                        self.timestamp += 1
                         self.probeAndInsert2(r, tuple2, self.left_table, 
-                                             self.right_table, time())
+                                             self.right_table, self.timestamp)
                 except Exception:
                     # This catch:
                     # Empty: in tuple2 = self.right.get(False), when the queue is empty.
@@ -116,10 +123,7 @@ class NestedHashOptional(Optional):
         #return
 
     def getResource(self, tuple):
-        resource = ''
-        for var in self.vars:
-            resource = resource + tuple[var]
-        return resource
+        return self.key(tuple)
 
     def makeInstantiation(self, tuple, operator):
         #print "making instantiation", tuple, operator
@@ -10,27 +10,31 @@ Autor: Gabriela Montoya
 Date: January 29th, 2014
 
 '''
-from multiprocessing import Queue, Process
-from time import time
+from multiprocessing import Process
+from ANAPSID.Operators.Channel import Channel, wait
 import string, sys
 from Queue import Empty
 from ANAPSID.Operators.Optional import Optional
 from ANAPSID.Decomposer.Tree import Leaf, Node
 from OperatorStructures import Table, Partition, Record
+from ANAPSID.Operators.JoinKey import joinKey
+from ANAPSID.NonBlockingOperators import BindJoin
+from ANAPSID.Operators.Clock import monotonic
+from ANAPSID.Operators import Cancellation
 
 
-WINDOW_SIZE = 10
-
 class NestedHashOptionalFilter(Optional):
 
     def __init__(self, vars_left, vars_right):
         self.left_table = dict()
         self.right_table = dict()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.bag         = []
         self.vars_left   = set(vars_left)
         self.vars_right  = set(vars_right)
         self.vars        = list(self.vars_left & self.vars_right)
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars_left = self.vars_left - set(d.keys())
@@ -53,7 +57,18 @@ class NestedHashOptionalFilter(Optional):
         right_queues = dict()
         filter_bag = []
         count = 0
+        controller = BindJoin.WindowController(right_operator)
+        since = None    # Arrival of the first tuple of filter_bag.
         while (not(tuple1 == "EOF") or (len(right_queues) > 0)):
+            if Cancellation.cancelled():
+                # The answers are not needed: the instantiations in
+                # flight, and the next ones, are dropped.
+                break
+
+            # Sleep until the left queue, if it has not ended, or a right queue has a tuple,
+            # or until the deadline of filter_bag.
+            wait(([self.left_queue] if tuple1 != "EOF" else []) + right_queues.values(),
+                 controller.timeout(since) if filter_bag else None)
 
             try:
                 tuple1 = self.left_queue.get(False)
@@ -63,37 +78,17 @@ class NestedHashOptionalFilter(Optional):
                     #tuple1 = self.left_queue.get(False)
                     #print "tuple1: "+str(tuple1)
                     self.bag.append(tuple1)
+                    self.timestamp += 1
                     instance = self.probeAndInsert1(tuple1, self.right_table,
-                                                    self.left_table, time())
+                                                    self.left_table, self.timestamp)
                     #print "sali de probe and insert 1 con tuple", tuple1
                     if instance: # the join variables have not been used to
                                  # instanciate the right_operator
+                        if not filter_bag:
+                            since = monotonic()
                         filter_bag.append(tuple1)
                     #print "filter_bag", len(filter_bag)
 
-                    if len(filter_bag) >= WINDOW_SIZE:
-                        new_right_operator = self.makeInstantiation(filter_bag,
-                                                                    self.right_operator)
-                        #print "Here in makeInstantation with filter"
-                        #resource = self.getResource(tuple1)
-                        queue = Queue()
-                        right_queues[count] = queue
-                        new_right_operator.execute(queue)
-                        filter_bag = []
-                        count = count + 1
-            
-                else:
-                    if (len(filter_bag) > 0):
-                        #print "here", len(filter_bag), filter_bag
-                        new_right_operator = self.makeInstantiation(filter_bag,
-                                                                    self.right_operator)
-                        #resource = self.getResource(tuple1)
-                        queue = Queue()
-                        right_queues[count] = queue
-                        new_right_operator.execute(queue)
-                        filter_bag = []
-                        count = count + 1
-
             except Empty:
                     pass
             except Exception as e:
@@ -101,6 +96,18 @@ class NestedHashOptionalFilter(Optional):
                     #print e
                     pass
 
+            # Instantiate the right operator when filter_bag is full or
+            # reached its deadline, or when the left tuples ended.
+            if filter_bag and ((tuple1 == "EOF") or controller.full(filter_bag, since)):
+                new_right_operator = self.makeInstantiation(filter_bag,
+                                                            self.right_operator)
+                queue = Channel()
+                right_queues[count] = queue
+                controller.sent(count, len(filter_bag))
+                new_right_operator.execute(queue, False)
+                filter_bag = []
+                count = count + 1
+
             toRemove = [] # stores the queues that have already received all its tuples
             #print "right_queues", right_queues
             for r in right_queues:
@@ -112,12 +119,15 @@ class NestedHashOptionalFilter(Optional):
                         
                         if (tuple2 == "EOF"):
                             toRemove.append(r)
+                            controller.finished(r)
                         else:
+                            controller.received(r)
                             resource = self.getResource(tuple2)
                             for v in self.vars:
                                 del tuple2[v]
                             #print "new tuple2", tuple2
-                            self.probeAndInsert2(resource, tuple2, self.left_table, self.right_table, time())
+                            self.timestamp += 1
+                            self.probeAndInsert2(resource, tuple2, self.left_table, self.right_table, self.timestamp)
                 except Exception:
                     # This catch:
                     # Empty: in tuple2 = self.right.get(False), when the queue is empty.
@@ -143,54 +153,12 @@ class NestedHashOptionalFilter(Optional):
         return
 
     def getResource(self, tuple):
-        resource = ''
-        for var in self.vars:
-            resource = resource + tuple[var]
-        return resource
+        return self.key(tuple)
 
     def makeInstantiation(self, filter_bag, operator):
-        filter_str = ''
-        new_vars = ['?'+v for v in self.vars] #TODO: this might be $
-
-        #print "making instantiation join filter", filter_bag 
-        # When join variables are more than one: FILTER ( )
-        if len(self.vars) >= 1:
-            filter_str = ' . FILTER (__expr__)'
-
-            or_expr = []
-            for tuple in filter_bag:
-                and_expr = []
-                for var in self.vars:
-                    #aux = "?" + var + "==" + tuple[var]
-                    v = tuple[var]
-                    if string.find(v, "http") == 0: # uris must be passed between < .. >
-                        v = "<"+v+">"
-                    else:
-                        v = '"'+v+'"'
-                    v = "?" + var + "=" + v
-                    and_expr.append(v)                   
-
-                or_expr.append('(' + ' && '.join(and_expr) + ')')
-            filter_str = filter_str.replace('__expr__', ' || '.join(or_expr))
-
-        # When join variables is a singleton: FILTER ?var IN ()
-        #else:
-        #    
-        #    filter_str = ' . FILTER ?' + list(self.vars)[0] + ' IN (__expr__)'
-        #
-        #    expr = []
-        #    for tuple in filter_bag:
-        #        v = tuple[list(self.vars)[0]]
-        #        if string.find(v, "http") == 0: # uris must be passed between < .. >
-        #            v = "<"+v+">"
-        #        expr.append(v)
-        #    filter_str = filter_str.replace('__expr__', ' , '.join(expr))
-             
-        #print "filter expression:", filter_str
-        #print "type(operator)", type(operator)
-        new_operator = operator.instantiateFilter(set(new_vars), filter_str)
-        #print "type(new_operator)", type(new_operator)
-        return new_operator
+        # The values are given in a VALUES block, or in a FILTER if an
+        # endpoint of the operator does not accept VALUES.
+        return BindJoin.makeInstantiation(self.vars, filter_bag, operator)
 
     def probeAndInsert1(self, tuple, table1, table2, time):
         #print "in probeAndInsert1", tuple
@@ -6,10 +6,10 @@ The intermediate results are represented as queues.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
-from time import time
+from ANAPSID.Operators.Channel import Channel, wait
 from ANAPSID.Operators.Join import Join
 from OperatorStructures import Table, Partition, Record
+from ANAPSID.Operators.JoinKey import joinKey
 
 
 class SymmetricHashJoin(Join):
@@ -17,8 +17,10 @@ class SymmetricHashJoin(Join):
     def __init__(self, vars):
         self.left_table  = Table()
         self.right_table = Table()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.vars        = vars
+        self.key         = joinKey(self.vars)
+        self.timestamp   = 0        # Sequence number of the last event.
 
     def instantiate(self, d):
         newvars = self.vars - set(d.keys())
@@ -36,6 +38,8 @@ class SymmetricHashJoin(Join):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((self.left, tuple1), (self.right, tuple2)) if t != "EOF"])
 
             # Try to get and process tuple from left queue.
             if not(tuple1 == "EOF"):
@@ -78,13 +82,11 @@ class SymmetricHashJoin(Join):
         # Insert the tuple in its corresponding partition and probe.
 
         # Get the attribute(s) to apply hash.
-        att = ''
-        for var in self.vars:
-            att = att + tuple[var]
-        i = hash(att) % table1.size;
+        i = hash(self.key(tuple)) % table1.size;
 
         # Insert record in partition.
-        record = Record(tuple, time(), 0)
+        self.timestamp += 1
+        record = Record(tuple, self.timestamp, 0)
         table1.insertRecord(i, record)
 
         # Probe the record against its partition in the other table.
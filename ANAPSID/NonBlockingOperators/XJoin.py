@@ -6,7 +6,7 @@ The intermediate results are represented as queues.
 
 @author: Maribel Acosta Deibe
 '''
-from multiprocessing import Queue
+from ANAPSID.Operators.Channel import Channel, wait
 from Queue import Empty
 from tempfile import NamedTemporaryFile
 from threading import Timer
@@ -14,14 +14,16 @@ from random import randint
 from os import remove
 from ANAPSID.Operators.Join import Join
 from OperatorStructures import Table, Partition, Record, FileDescriptor, isOverlapped
+from ANAPSID.Operators.JoinKey import joinKey
 
 class XJoin(Join):
 
     def __init__(self, vars):
         self.left_table  = Table()
         self.right_table = Table()
-        self.qresults    = Queue()
+        self.qresults    = Channel()
         self.vars        = vars
+        self.key         = joinKey(self.vars)
         self.timestamp   = 0
 
         # Second stage settings
@@ -56,6 +58,8 @@ class XJoin(Join):
 
         # Get the tuples from the queues.
         while (not(tuple1 == "EOF") or not(tuple2 == "EOF")):
+            # Sleep until a queue that has not ended has a tuple.
+            wait([q for (q, t) in ((self.left, tuple1), (self.right, tuple2)) if t != "EOF"])
 
             if (self.memory_left + self.memory_right >= self.memorySize):
                 self.flushPartition()
@@ -109,10 +113,7 @@ class XJoin(Join):
         # Stage 1: While both sources are sending data.
 
         # Get the attribute(s) to apply hash.
-        att = ''
-        for var in self.vars:
-            att = att + tuple[var]
-        i = hash(att) % table1.size;
+        i = hash(self.key(tuple)) % table1.size;
 
         # Insert record in partition.
         #record = Record(tuple, time(), 0)
@@ -0,0 +1,31 @@
+'''
+Created on Oct 18, 2026
+
+Implements the cancellation of the evaluation of a plan.
+
+When the plan has produced all the tuples that are needed (Xlimit
+received its limit), it is cancelled: the sources stop requesting pages
+and receiving answers, the nested joins drop the instantiations of
+their right operators, and the processes of the plan are terminated by
+run_anapsid. The signal is an Event created by newPlan, before the
+processes of the plan are forked, so all of them share it.
+'''
+from multiprocessing import Event
+
+CHECK_EVERY = 256    # Tuples of an answer received between checks.
+
+event = None
+
+
+def newPlan():
+    # Called when a plan is created.
+    global event
+    event = Event()
+
+def cancel():
+    # The tuples produced by the plan are no longer needed.
+    if event is not None:
+        event.set()
+
+def cancelled():
+    return (event is not None) and event.is_set()
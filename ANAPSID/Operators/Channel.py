@@ -0,0 +1,431 @@
+'''
+Created on Oct 18, 2026
+
+Implements the channel used to transfer tuples between the processes of
+the operators.
+
+A channel is used as a queue (put, get): tuples are put one by one and
+read one by one, and "EOF" ends the stream. Internally, the tuples are
+buffered and moved in lists, so a list of tuples is pickled and sent
+at once instead of one message per tuple.
+
+The buffer is flushed when it has BATCH_SIZE tuples, when "EOF" is put,
+and when its oldest tuple has waited MAX_DELAY seconds, even if the
+producer does not put more tuples (e.g., an operator waiting for its
+inputs). The first tuple of a channel is sent right away, so the first
+answers are not delayed.
+
+The lists are sent through a multiprocessing queue (Channel), or
+serialized in a ring buffer of shared memory (RingChannel): the bytes
+are copied once into the ring by the producer and once out of it by the
+consumer, without pipes nor feeder threads, and the producer waits when
+the ring is full, so the memory used by an edge is bounded. TRANSPORT
+tells which one is used by the edges of the plans: 'queue', 'ring', or
+'leaves' (rings only for the edges that carry the answers of the
+sources).
+
+The operators with several inputs sleep in wait until one of them has
+tuples to read, instead of polling them with get(False): the pipe of a
+queue, or a pipe written by the producer of a ring after every list
+(its bell), becomes readable.
+
+The producer of an edge may put its tuples through project, which only
+sends the variables needed by the plan above the edge. With EDGE_LOG,
+the producer of every edge of the plan writes in .edges.log the tuples
+and the bytes (pickled) it sent.
+'''
+import os
+import errno
+import fcntl
+import select
+import struct
+import ctypes
+import marshal
+import cPickle
+import logging
+from collections import deque
+from multiprocessing import Queue, Condition, Lock as ProcessLock
+from multiprocessing.sharedctypes import RawArray, RawValue
+from Queue import Empty
+from threading import Thread, Lock
+from time import time, sleep
+
+BATCH_SIZE = 256               # Tuples sent in one message.
+MAX_DELAY  = 0.05              # Seconds a tuple may wait in the buffer.
+RING_SIZE  = 1024 * 1024       # Bytes of the ring of a RingChannel.
+TRANSPORT  = 'queue'           # Transport of the edges: queue, ring or leaves.
+EDGE_LOG   = False             # Whether the bytes sent by the edges are logged.
+
+HEADER  = struct.Struct('<IB') # Length and serialization of a list.
+MARSHAL = 0
+PICKLE  = 1
+
+
+def configure(batchSize=None, maxDelay=None, ringSize=None, transport=None,
+              edgeLog=None):
+    # Called before the plan is executed, so forked processes inherit it.
+    global BATCH_SIZE, MAX_DELAY, RING_SIZE, TRANSPORT, EDGE_LOG
+    if batchSize is not None:
+        BATCH_SIZE = batchSize
+    if maxDelay is not None:
+        MAX_DELAY = maxDelay
+    if ringSize is not None:
+        RING_SIZE = ringSize
+    if transport is not None:
+        TRANSPORT = transport
+    if edgeLog is not None:
+        EDGE_LOG = edgeLog
+
+def create(transport=None):
+    # Returns a channel of the transport, TRANSPORT by default.
+    if (transport or TRANSPORT) == 'ring':
+        return RingChannel()
+    return Channel()
+
+def project(channel, vars):
+    # Returns where the producer of the edge puts its tuples, so only
+    # the variables in vars are sent; all of them if vars is None.
+    if vars is None:
+        return channel
+    return Projection(channel, vars)
+
+
+class Projection(object):
+    '''
+    Represents the end of a channel where a producer puts its tuples.
+    It is composed by the channel, and the variables of the tuples that
+    are sent; the others are not needed by the consumer, nor above it.
+    '''
+    def __init__(self, channel, vars):
+        self.channel = channel
+        self.vars    = list(vars)
+
+    def put(self, item, block=True, timeout=None):
+        if (item != "EOF"):
+            item = dict([(var, item[var]) for var in self.vars if var in item])
+        self.channel.put(item, block, timeout)
+
+
+class Channel(object):
+    '''
+    Represents a queue of tuples transferred in lists.
+    It is composed by the multiprocessing queue of the lists, the buffer
+    of the tuples put by this process, and the tuples received by this
+    process that have not been read yet.
+    '''
+    def __init__(self, batchSize=None):
+        self.queue     = Queue()
+        self.batchSize = batchSize   # BATCH_SIZE if None.
+        self.started   = False   # Whether a tuple has been sent.
+        self.label     = None    # Name of the edge of the plan, if any.
+        self.reset()
+
+    def reset(self):
+        # The buffers are local to a process; a forked process starts
+        # with empty ones, and does not share the parent's lock.
+        self.pid      = os.getpid()
+        self.lock     = Lock()
+        self.buffer   = []
+        self.since    = None     # Time the oldest buffered tuple was put.
+        self.received = deque()
+        self.sent     = [0, 0]   # Tuples and bytes sent by this process (EDGE_LOG).
+
+    def put(self, item, block=True, timeout=None):
+        if self.pid != os.getpid():
+            self.reset()
+        self.lock.acquire()
+        try:
+            self.buffer.append(item)
+            if self.since is None:
+                self.since = time()
+            if (item == "EOF") or not self.started or (len(self.buffer) >= (self.batchSize or BATCH_SIZE)):
+                self.send()
+                if (item == "EOF") and EDGE_LOG and (self.label is not None):
+                    logEdge(self)
+            elif (time() - self.since >= MAX_DELAY):
+                self.send()
+            else:
+                watch(self)
+        finally:
+            self.lock.release()
+
+    def send(self):
+        # Called with the lock acquired.
+        if self.buffer:
+            if EDGE_LOG and (self.label is not None):
+                self.sent[0] += len([t for t in self.buffer if t != "EOF"])
+                self.sent[1] += len(cPickle.dumps(self.buffer, 2))
+            self.transmit(self.buffer)
+            self.buffer = []
+            self.since = None
+            self.started = True
+
+    def flush(self, age=0):
+        # Sends the tuples that have waited at least age seconds.
+        if self.pid != os.getpid():
+            return
+        self.lock.acquire()
+        try:
+            if (self.since is not None) and (time() - self.since >= age):
+                self.send()
+            if not self.buffer:
+                unwatch(self)
+        finally:
+            self.lock.release()
+
+    def get(self, block=True, timeout=None):
+        # Returns the next tuple, or raises Queue.Empty.
+        if self.pid != os.getpid():
+            self.reset()
+        if not self.received:
+            self.received.extend(self.receive(block, timeout))
+        return self.received.popleft()
+
+    def ready(self):
+        # Whether get(False) returns a tuple.
+        if self.pid != os.getpid():
+            self.reset()
+        return bool(self.received) or not self.queue.empty()
+
+    def fileno(self):
+        # Readable when a list is sent.
+        return self.queue._reader.fileno()
+
+    def transmit(self, batch):
+        self.queue.put(batch)
+
+    def receive(self, block, timeout):
+        return self.queue.get(block, timeout)
+
+
+class RingChannel(Channel):
+    '''
+    Represents a channel whose lists are serialized in a ring buffer of
+    shared memory.
+    It is composed by the ring, the counters of bytes written and read
+    since the channel was created, the condition that signals changes
+    of the counters, and the lock held by a producer while it writes a
+    list, besides the buffers of the channel.
+    '''
+    def __init__(self, capacity=None, batchSize=None):
+        self.capacity  = capacity or RING_SIZE
+        self.ring      = RawArray(ctypes.c_char, self.capacity)
+        self.address   = ctypes.addressof(self.ring)
+        self.written   = RawValue(ctypes.c_ulonglong, 0)
+        self.read      = RawValue(ctypes.c_ulonglong, 0)
+        self.changed   = Condition()
+        self.writing   = ProcessLock()
+        self.bell      = os.pipe()
+        for fd in self.bell:
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.batchSize = batchSize
+        self.started   = False
+        self.label     = None
+        self.reset()
+
+    def ready(self):
+        if self.pid != os.getpid():
+            self.reset()
+        if self.received or (self.written.value != self.read.value):
+            return True
+        # The bell is cleared before checking again, so a list written
+        # meanwhile is seen now or rings it again.
+        try:
+            os.read(self.bell[0], 4096)
+        except OSError:
+            pass
+        return (self.written.value != self.read.value)
+
+    def fileno(self):
+        return self.bell[0]
+
+    def transmit(self, batch):
+        try:
+            (data, kind) = (marshal.dumps(batch), MARSHAL)
+        except ValueError:
+            # Tuples with values that marshal does not support.
+            (data, kind) = (cPickle.dumps(batch, 2), PICKLE)
+        self.writing.acquire()
+        try:
+            self.write(HEADER.pack(len(data), kind))
+            self.write(data)
+        finally:
+            self.writing.release()
+        try:
+            os.write(self.bell[1], '.')
+        except OSError:
+            # The pipe is full: the bell is already ringing.
+            pass
+
+    def write(self, data):
+        # Copies data into the ring, waiting for free space as needed.
+        # Data larger than the ring is written while it is read.
+        source = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+        offset = 0
+        while offset < len(data):
+            self.changed.acquire()
+            try:
+                while (self.written.value - self.read.value >= self.capacity):
+                    self.changed.wait()
+                free = self.capacity - (self.written.value - self.read.value)
+                position = self.written.value % self.capacity
+            finally:
+                self.changed.release()
+            n = min(free, len(data) - offset, self.capacity - position)
+            ctypes.memmove(self.address + position, source + offset, n)
+            offset += n
+            self.changed.acquire()
+            try:
+                self.written.value += n
+                self.changed.notify_all()
+            finally:
+                self.changed.release()
+
+    def receive(self, block, timeout):
+        self.changed.acquire()
+        try:
+            if (self.written.value == self.read.value):
+                if not block:
+                    raise Empty
+                deadline = None if timeout is None else time() + timeout
+                while (self.written.value == self.read.value):
+                    if deadline is None:
+                        self.changed.wait()
+                    elif (deadline <= time()):
+                        raise Empty
+                    else:
+                        self.changed.wait(deadline - time())
+        finally:
+            self.changed.release()
+        # Once a list has begun to be written, it is read entirely.
+        (n, kind) = HEADER.unpack(self.readBytes(HEADER.size))
+        data = self.readBytes(n)
+        if (kind == PICKLE):
+            return cPickle.loads(data)
+        return marshal.loads(data)
+
+    def readBytes(self, n):
+        parts = []
+        while n > 0:
+            self.changed.acquire()
+            try:
+                while (self.written.value == self.read.value):
+                    self.changed.wait()
+                available = self.written.value - self.read.value
+                position = self.read.value % self.capacity
+            finally:
+                self.changed.release()
+            k = min(available, n, self.capacity - position)
+            parts.append(ctypes.string_at(self.address + position, k))
+            n -= k
+            self.changed.acquire()
+            try:
+                self.read.value += k
+                self.changed.notify_all()
+            finally:
+                self.changed.release()
+        return ''.join(parts)
+
+
+def wait(queues, timeout=None):
+    # Returns the queues that have tuples to read, waiting until one of
+    # them has or timeout seconds. It returns no queue when a signal is
+    # received (e.g., an alarm), so the caller can check its state. The
+    # queues are channels or multiprocessing queues.
+    deadline = None if timeout is None else time() + timeout
+    while True:
+        ready = [q for q in queues if isReady(q)]
+        if ready or not queues:
+            return ready
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time()
+            if (remaining <= 0):
+                return []
+        poller = select.poll()
+        for q in queues:
+            poller.register(descriptor(q), select.POLLIN)
+        try:
+            poller.poll(None if remaining is None else remaining * 1000)
+        except select.error as e:
+            if (e.args[0] == errno.EINTR):
+                return []
+            raise
+
+def isReady(queue):
+    if isinstance(queue, Channel):
+        return queue.ready()
+    return not queue.empty()
+
+def descriptor(queue):
+    if isinstance(queue, Channel):
+        return queue.fileno()
+    return queue._reader.fileno()
+
+
+edgeLogger = None
+
+def logEdge(channel):
+    # Called by the producer of an edge when it puts "EOF".
+    global edgeLogger
+    if edgeLogger is None:
+        edgeLogger = logging.getLogger(__name__)
+        edgeLogger.setLevel(logging.INFO)
+        handler = logging.FileHandler('.edges.log')
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        edgeLogger.addHandler(handler)
+    edgeLogger.info(channel.label + ": " + str(channel.sent[0]) + " tuples, "
+                    + str(channel.sent[1]) + " bytes")
+
+
+watched = set()     # Channels of this process with buffered tuples.
+watchedLock = Lock()
+watchedPid = None
+startLock = Lock()
+
+def watch(channel):
+    # The flusher of the process sends the tuples that wait too long.
+    if watchedPid != os.getpid():
+        start()
+    if channel in watched:
+        return
+    watchedLock.acquire()
+    try:
+        watched.add(channel)
+    finally:
+        watchedLock.release()
+
+def start():
+    # Forked process: the flusher of the parent does not exist here.
+    global watched, watchedLock, watchedPid
+    startLock.acquire()
+    try:
+        if watchedPid == os.getpid():
+            return
+        watched = set()
+        watchedLock = Lock()
+        watchedPid = os.getpid()
+        t = Thread(target=flusher)
+        t.daemon = True
+        t.start()
+    finally:
+        startLock.release()
+
+def unwatch(channel):
+    # Called with the lock of the channel acquired, as watch.
+    watchedLock.acquire()
+    try:
+        watched.discard(channel)
+    finally:
+        watchedLock.release()
+
+def flusher():
+    while True:
+        sleep(MAX_DELAY / 2)
+        watchedLock.acquire()
+        try:
+            channels = list(watched)
+        finally:
+            watchedLock.release()
+        for c in channels:
+            c.flush(MAX_DELAY)
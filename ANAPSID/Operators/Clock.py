@@ -0,0 +1,36 @@
+'''
+Created on Oct 18, 2026
+
+Implements a monotonic clock. Unlike time(), it does not jump when the
+clock of the system is adjusted, so it measures how long the operators
+wait for their inputs. Python 2 has no time.monotonic, so it calls
+clock_gettime, or falls back to time() where it is not available.
+'''
+import sys
+import ctypes
+import ctypes.util
+from time import time
+
+CLOCK_MONOTONIC = 6 if sys.platform == 'darwin' else 1
+
+
+class timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+try:
+    library = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'))
+    clock_gettime = library.clock_gettime
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+except (OSError, AttributeError, TypeError):
+    clock_gettime = None
+
+
+def monotonic():
+    # Returns the seconds since an arbitrary point.
+    if clock_gettime is None:
+        return time()
+    t = timespec()
+    if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+        return time()
+    return t.tv_sec + t.tv_nsec * 1e-9
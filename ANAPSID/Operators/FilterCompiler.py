@@ -0,0 +1,394 @@
+'''
+Created on Oct 18, 2026
+
+Implements the compilation of the expressions of the filters.
+
+compileFilter turns the Expression tree of a Filter into a Python closure
+once, at plan time, so the tuples are not dispatched through the tree.
+The constants are converted to Python values, and the regular
+expressions are compiled, when the filter is compiled.
+
+A term of a tuple is a string as built by ResultsParser.decodeBinding:
+an IRI, a literal, a typed literal value^^<datatype>, or a literal with
+a language tag value@lang. Only a suffix that reads as a language tag
+(a primary subtag of two or three letters, e.g., @en or @pt-BR) is taken
+for one, so a plain literal such as "joe@example" stays a plain literal.
+The numeric and boolean typed literals are compared as Python numbers
+and booleans, the literals with a language tag as (value, lang) pairs,
+which are only equal to the same pairs, and the other terms as strings
+(plain literals that read as numbers are compared with numbers as
+numbers, e.g., ?mass > '5'). The language tag is only removed by STR,
+LANG and LANGMATCHES. As in SPARQL, a type error, or an unbound
+variable, makes the
+expression an error, and the tuples whose filter is an error are
+discarded; || and && are true, or false, if one of their operands is,
+even when the other one is an error.
+'''
+import re
+import operator
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+def toBoolean(lexical):
+    if lexical in ('true', '1'):
+        return True
+    if lexical in ('false', '0'):
+        return False
+    raise ValueError(lexical)
+
+casts = {
+        'integer' : int,
+        'decimal' : float,
+        'float'   : float,
+        'double'  : float,
+        'string'  : str,
+        'boolean' : toBoolean,
+        'dateTime' : str,
+        'nonPositiveInteger' : int,
+        'negativeInteger' : int,
+        'long'    : long,
+        'int'     : int,
+        'short'   : int,
+        'byte'    : int,
+        'nonNegativeInteger' : int,
+        'unsignedLong' : long,
+        'unsignedInt'  : int,
+        'unsignedShort' : int,
+        'unsignedByte' : int,
+        'positiveInteger' : int
+        }
+
+logical_connectives = set(['||', '&&'])
+
+arithmetic_operators = {
+        '*'  : operator.mul,
+        '/'  : operator.truediv,
+        '+'  : operator.add,
+        '-'  : operator.sub
+        }
+
+test_operators = {
+        '='  : operator.eq,
+        '!=' : operator.ne,
+        '<'  : operator.lt,
+        '>'  : operator.gt,
+        '<=' : operator.le,
+        '>=' : operator.ge
+        }
+
+regex_flags = {
+        'i' : re.IGNORECASE,
+        's' : re.DOTALL,
+        'm' : re.MULTILINE,
+        'x' : re.VERBOSE
+        }
+
+numbers = frozenset([int, long, float])
+
+# Terms of the literals with a language tag.
+language = re.compile(r'(.*)@([a-zA-Z]{2,3}(?:-[a-zA-Z0-9]{1,8})*)$', re.DOTALL)
+
+RDF_LANG_STRING = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#langString'
+
+
+class SPARQLTypeError(Exception):
+    """Base class for exceptions in this module."""
+    pass
+
+
+def compileFilter(filter):
+    # Returns a function that tells whether a tuple passes the filter.
+    expr = compileExpression(filter.expr)
+
+    def test(tuple):
+        try:
+            return ebv(expr(tuple))
+        except SPARQLTypeError:
+            return False
+    return test
+
+def languageLiteral(term):
+    # Returns the match of a literal with a language tag, or None.
+    if ('@' in term) and ('^^<' not in term):
+        return language.match(term)
+    return None
+
+def value(term):
+    # Converts a term to the Python value it is compared as.
+    m = languageLiteral(term)
+    if m:
+        return (m.group(1), m.group(2).lower())
+    if ('^^' in term):
+        pos = term.rfind('^^<')
+        if (pos > -1):
+            lexical = term[:pos]
+            datatype = term[pos+3:-1]
+            cast = casts.get(datatype[datatype.rfind('#')+1:], None)
+            if cast is None:
+                return lexical
+            try:
+                return cast(lexical)
+            except ValueError:
+                raise SPARQLTypeError
+    return term
+
+def ebv(val):
+    # The Effective Boolean Value, see http://www.w3.org/TR/sparql11-query/#ebv
+    if (type(val) is bool):
+        return val
+    if (type(val) in numbers):
+        return not ((val == 0) or (val != val))
+    if isinstance(val, basestring):
+        return len(val) > 0
+    raise SPARQLTypeError
+
+def constantTerm(name):
+    # Converts a constant of a query to a term of a tuple.
+    if name.startswith('<') and name.endswith('>'):
+        return name[1:-1]
+    if name.startswith('"') or name.startswith("'"):
+        quote = name[0]
+        end = name.rfind(quote)
+        lexical = name[1:end]
+        suffix = name[end+1:]
+        if suffix.startswith('^^'):
+            datatype = suffix[2:]
+            if datatype.startswith('xsd:'):
+                datatype = '<' + XSD + datatype[4:] + '>'
+            return lexical + '^^' + datatype
+        return lexical + suffix
+    if name in ('true', 'false'):
+        return name + '^^<' + XSD + 'boolean>'
+    if ('.' in name):
+        return name + '^^<' + XSD + 'decimal>'
+    if name.isdigit():
+        return name + '^^<' + XSD + 'integer>'
+    return name
+
+def compileTerm(arg):
+    # Returns the functions that give the term and the value of an argument.
+    if arg.constant:
+        term = constantTerm(arg.name)
+        val = value(term)
+        return ((lambda tuple: term), (lambda tuple: val))
+    name = arg.name[1:]
+
+    def getTerm(tuple):
+        try:
+            return tuple[name]
+        except KeyError:
+            raise SPARQLTypeError
+
+    def getValue(tuple):
+        try:
+            return value(tuple[name])
+        except KeyError:
+            raise SPARQLTypeError
+    return (getTerm, getValue)
+
+def compileOperand(expr):
+    # Returns the functions that give the term and the value of an operand.
+    if hasattr(expr, 'op'):
+        val = compileExpression(expr)
+        return ((lambda tuple: lexicalForm(val(tuple))), val)
+    return compileTerm(expr)
+
+def compileExpression(expr):
+    # Returns a function that gives the value of the expression for a tuple.
+    if not hasattr(expr, 'op'):
+        return compileTerm(expr)[1]
+    op = expr.op
+    if (op in logical_connectives):
+        return compileLogicalConnective(op, compileExpression(expr.left),
+                                        compileExpression(expr.right))
+    if (op in test_operators) and (expr.right is not None):
+        return compileTest(op, compileExpression(expr.left), compileExpression(expr.right))
+    if (op in arithmetic_operators) and (expr.right is not None):
+        return compileArithmetic(op, compileExpression(expr.left),
+                                 compileExpression(expr.right))
+    if (op in ('!', '+', '-')):
+        return compileUnaryOperator(op, compileExpression(expr.left))
+    return compileFunction(expr)
+
+def compileLogicalConnective(op, left, right):
+    if (op == '||'):
+        def evaluate(tuple):
+            try:
+                if ebv(left(tuple)):
+                    return True
+            except SPARQLTypeError:
+                if ebv(right(tuple)):
+                    return True
+                raise SPARQLTypeError
+            return ebv(right(tuple))
+    else:
+        def evaluate(tuple):
+            try:
+                if not ebv(left(tuple)):
+                    return False
+            except SPARQLTypeError:
+                if not ebv(right(tuple)):
+                    return False
+                raise SPARQLTypeError
+            return ebv(right(tuple))
+    return evaluate
+
+def compileTest(op, left, right):
+    test = test_operators[op]
+    equality = (op in ('=', '!='))
+
+    def evaluate(tuple):
+        a = left(tuple)
+        b = right(tuple)
+        if (type(a) is type(b)) or ((type(a) in numbers) and (type(b) in numbers)) \
+                or (isinstance(a, basestring) and isinstance(b, basestring)):
+            return test(a, b)
+        # A number and a plain literal that reads as a number, e.g.,
+        # ?mass > '5', are compared as numbers (as Virtuoso does).
+        try:
+            if (type(a) in numbers) and isinstance(b, basestring):
+                return test(a, float(b))
+            if isinstance(a, basestring) and (type(b) in numbers):
+                return test(float(a), b)
+        except ValueError:
+            pass
+        if equality:
+            return (op == '!=')
+        raise SPARQLTypeError
+    return evaluate
+
+def compileArithmetic(op, left, right):
+    arithmetic = arithmetic_operators[op]
+
+    def evaluate(tuple):
+        a = left(tuple)
+        b = right(tuple)
+        if (type(a) in numbers) and (type(b) in numbers):
+            try:
+                return arithmetic(a, b)
+            except ZeroDivisionError:
+                raise SPARQLTypeError
+        raise SPARQLTypeError
+    return evaluate
+
+def compileUnaryOperator(op, left):
+    if (op == '!'):
+        return lambda tuple: not ebv(left(tuple))
+    negate = (op == '-')
+
+    def evaluate(tuple):
+        a = left(tuple)
+        if (type(a) in numbers):
+            return -a if negate else a
+        raise SPARQLTypeError
+    return evaluate
+
+def compileFunction(expr):
+    # The unary and binary functions (unaryFunctor and binaryFunctor).
+    name = expr.op.upper()
+    arg = expr.left
+    if (name == 'BOUND'):
+        var = arg.name[1:]
+        return lambda tuple: var in tuple
+    (term, left) = compileOperand(arg)
+
+    if (name == 'REGEX'):
+        return compileRegex(left, expr.right)
+    if (name == 'SAMETERM'):
+        right = compileOperand(expr.right)[0]
+        return lambda tuple: term(tuple) == right(tuple)
+    if (name == 'CONTAINS'):
+        right = compileExpression(expr.right)
+        return lambda tuple: string(right(tuple)) in string(left(tuple))
+    if (name == 'LANGMATCHES'):
+        right = compileExpression(expr.right)
+        return lambda tuple: langMatches(string(left(tuple)), string(right(tuple)))
+
+    if (name in ('ISIRI', 'ISURI')):
+        return lambda tuple: isIRI(term(tuple))
+    if (name == 'ISBLANK'):
+        return lambda tuple: term(tuple).startswith('_:')
+    if (name == 'ISLITERAL'):
+        return lambda tuple: not (isIRI(term(tuple)) or term(tuple).startswith('_:'))
+    if (name == 'STR'):
+        return lambda tuple: lexicalForm(term(tuple))
+    if (name == 'UCASE'):
+        return lambda tuple: string(left(tuple)).upper()
+    if (name == 'LANG'):
+        return lambda tuple: lang(term(tuple))
+    if (name == 'DATATYPE'):
+        return lambda tuple: datatype(term(tuple))
+
+    # Casts, e.g., xsd:integer(?x).
+    local = expr.op.strip('<>')
+    local = local[max(local.rfind('#'), local.rfind(':'))+1:]
+    cast = casts.get(local, None)
+    if cast is not None:
+        def evaluate(tuple):
+            try:
+                return cast(lexicalForm(term(tuple)))
+            except ValueError:
+                raise SPARQLTypeError
+        return evaluate
+
+    # Functions that are not supported are errors.
+    def unsupported(tuple):
+        raise SPARQLTypeError
+    return unsupported
+
+def compileRegex(left, pattern):
+    # The pattern and the flags are constants, pattern.name and pattern.desc.
+    flags = 0
+    if pattern.desc:
+        for f in pattern.desc.strip('"\''):
+            flags |= regex_flags.get(f, 0)
+    regex = re.compile(pattern.name[1:-1], flags)
+    search = regex.search
+    return lambda tuple: search(string(left(tuple))) is not None
+
+def string(val):
+    # The string of a literal, without its language tag.
+    if isinstance(val, basestring):
+        return val
+    if (type(val) is tuple):
+        return val[0]
+    raise SPARQLTypeError
+
+def isIRI(term):
+    return (term.find("http") == 0) and ('^^<' not in term)
+
+def lexicalForm(term):
+    if (type(term) is tuple):
+        return term[0]
+    if not isinstance(term, basestring):
+        return str(term).lower() if (type(term) is bool) else str(term)
+    m = languageLiteral(term)
+    if m:
+        return m.group(1)
+    pos = term.rfind('^^<')
+    if (pos > -1):
+        return term[:pos]
+    return term
+
+def lang(term):
+    m = languageLiteral(term)
+    if m:
+        return m.group(2)
+    return ''
+
+def datatype(term):
+    if languageLiteral(term):
+        return RDF_LANG_STRING
+    pos = term.rfind('^^<')
+    if (pos > -1):
+        return term[pos+3:-1]
+    if isIRI(term):
+        raise SPARQLTypeError
+    return XSD + 'string'
+
+def langMatches(tag, range):
+    tag = tag.lower()
+    range = range.lower()
+    if (range == '*'):
+        return len(tag) > 0
+    return (tag == range) or tag.startswith(range + '-')
@@ -0,0 +1,21 @@
+'''
+Created on Oct 18, 2026
+
+Implements the keys of the hash tables of the join and optional
+operators.
+
+The key of a tuple is the value of its join variable, or the tuple of the
+values of its join variables, taken in the same order for both inputs.
+Unlike the concatenation of the values, it does not build a new string
+per tuple, and different values never produce the same key, e.g.,
+("ab", "c") and ("a", "bc").
+'''
+from operator import itemgetter
+
+
+def joinKey(vars):
+    # Returns a function that gives the key of a tuple for the variables.
+    vars = sorted(vars)
+    if not vars:
+        return lambda tuple: ()
+    return itemgetter(*vars)
@@ -0,0 +1,89 @@
+'''
+Created on Oct 18, 2026
+
+Implements the files where the operators keep the records flushed to
+secondary memory.
+
+A record is stored as a fixed header followed by its tuple serialized
+with marshal (cPickle for the values that marshal does not support):
+
+    probeTS, insertTS, flushTS (sequence numbers, 64-bit integers),
+    length (int), serialization
+
+The files are read through a memory mapping, without parsing text nor
+evaluating the tuples. The records are never modified once written.
+'''
+import os
+import mmap
+import struct
+import marshal
+import cPickle
+from tempfile import NamedTemporaryFile
+
+HEADER  = struct.Struct('<qqqIB')
+MARSHAL = 0
+PICKLE  = 1
+
+
+class SpillFile(object):
+    '''
+    Represents a file of records in secondary memory.
+    It is composed by the name of the file, and the number of records
+    and bytes written to it.
+    '''
+    def __init__(self, suffix=".rjt"):
+        file = NamedTemporaryFile(suffix=suffix, prefix="", delete=False)
+        self.name  = file.name
+        self.size  = 0
+        self.bytes = 0
+        file.close()
+
+    def append(self, records, flushTS):
+        # Writes the records at the end of the file.
+        parts = []
+        for record in records:
+            try:
+                (data, kind) = (marshal.dumps(record.tuple), MARSHAL)
+            except ValueError:
+                (data, kind) = (cPickle.dumps(record.tuple, 2), PICKLE)
+            parts.append(HEADER.pack(record.probeTS, record.insertTS, flushTS, len(data), kind))
+            parts.append(data)
+            self.size += 1
+        data = ''.join(parts)
+        file = open(self.name, 'ab')
+        try:
+            file.write(data)
+        finally:
+            file.close()
+        self.bytes += len(data)
+
+    def map(self):
+        # Returns a read-only mapping of the file, to be closed by the caller.
+        if (self.bytes == 0):
+            return None
+        file = open(self.name, 'rb')
+        try:
+            return mmap.mmap(file.fileno(), self.bytes, access=mmap.ACCESS_READ)
+        finally:
+            file.close()
+
+    def records(self, mapping):
+        # Yields (tuple, probeTS, insertTS, flushTS) for every record of
+        # the mapping.
+        if mapping is None:
+            return
+        position = 0
+        end = len(mapping)
+        while (position < end):
+            (probeTS, insertTS, flushTS, n, kind) = HEADER.unpack_from(mapping, position)
+            start = position + HEADER.size
+            data = mapping[start:start + n]
+            if (kind == PICKLE):
+                tuple = cPickle.loads(data)
+            else:
+                tuple = marshal.loads(data)
+            yield (tuple, probeTS, insertTS, flushTS)
+            position = start + n
+
+    def remove(self):
+        os.remove(self.name)
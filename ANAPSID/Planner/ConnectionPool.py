@@ -0,0 +1,202 @@
+'''
+Created on Oct 18, 2026
+
+Implements a pool of persistent (keep-alive) HTTP connections.
+A pool is kept for every endpoint (host:port) contacted by the
+process, so consecutive requests to the same endpoint (pages of a
+LIMIT/OFFSET query, ASK probes, COUNT queries) reuse the same TCP
+connection instead of opening a new one.
+
+Pools are local to a process. After a fork, the child process starts
+with empty pools, so sockets are never shared between processes.
+'''
+import httplib
+import socket
+import logging
+import os
+from threading import Lock, BoundedSemaphore
+from time import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.FileHandler('.connections.log')
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+POOL_SIZE = 4         # Maximum number of open connections per endpoint.
+IDLE_TIMEOUT = 30     # Seconds an idle connection is kept in the pool.
+
+# Errors raised by a kept-alive connection that was closed by the server.
+STALE_ERRORS = (httplib.BadStatusLine, httplib.CannotSendRequest,
+                httplib.ResponseNotReady, socket.error)
+
+
+class ConnectionPool(object):
+    '''
+    Represents the pool of connections to one endpoint.
+    It is composed by the list of idle connections, a semaphore that
+    bounds the number of open connections, and the counters used to
+    report how often connections are reused.
+    '''
+    def __init__(self, server, size=POOL_SIZE, idleTimeout=IDLE_TIMEOUT):
+        self.server      = server
+        self.size        = size
+        self.idleTimeout = idleTimeout
+        self.idle        = []      # List of (connection, lastUsed)
+        self.lock        = Lock()
+        self.slots       = BoundedSemaphore(size)
+        self.requests    = 0
+        self.reused      = 0
+        self.created     = 0
+        self.evicted     = 0
+
+    def acquire(self):
+        # Returns an idle connection, or a new one if none is available.
+        self.slots.acquire()
+        self.lock.acquire()
+        try:
+            self.evictIdle()
+            if self.idle:
+                (conn, _) = self.idle.pop()
+                conn.reused = True
+                return conn
+        finally:
+            self.lock.release()
+        return self.connect()
+
+    def connect(self):
+        conn = httplib.HTTPConnection(self.server)
+        conn.reused = False
+        self.count('created')
+        return conn
+
+    def release(self, conn, response=None):
+        # Returns the connection to the pool. The connection is kept
+        # only if the response was entirely read and the server did
+        # not ask to close it.
+        keep = (response is not None and response.isclosed()
+                and not response.will_close)
+        self.lock.acquire()
+        try:
+            if keep:
+                self.idle.append((conn, time()))
+            else:
+                conn.close()
+        finally:
+            self.lock.release()
+        self.slots.release()
+
+    def discard(self, conn):
+        # Closes a connection that can not be reused (e.g., on errors).
+        conn.close()
+        self.slots.release()
+
+    def evictIdle(self):
+        # Closes the connections that have been idle for too long.
+        now = time()
+        alive = []
+        for (conn, lastUsed) in self.idle:
+            if (now - lastUsed > self.idleTimeout):
+                conn.close()
+                self.evicted += 1
+            else:
+                alive.append((conn, lastUsed))
+        self.idle = alive
+
+    def request(self, method, url, body=None, headers={}):
+        # Sends the request and returns the connection and the response.
+        # If a reused connection was closed by the server, the request
+        # is retried once on a new connection.
+        conn = self.acquire()
+        try:
+            conn.request(method, url, body, headers)
+            response = conn.getresponse()
+        except STALE_ERRORS:
+            conn.close()
+            if not conn.reused:
+                self.slots.release()
+                raise
+            conn = self.connect()
+            try:
+                conn.request(method, url, body, headers)
+                response = conn.getresponse()
+            except Exception:
+                self.discard(conn)
+                raise
+        except Exception:
+            self.discard(conn)
+            raise
+        self.count('requests')
+        if conn.reused:
+            self.count('reused')
+        return (conn, response)
+
+    def count(self, counter):
+        # Counters are updated by the threads that share the pool.
+        self.lock.acquire()
+        try:
+            setattr(self, counter, getattr(self, counter) + 1)
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            for (conn, _) in self.idle:
+                conn.close()
+            self.idle = []
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        return {'requests': self.requests, 'reused': self.reused,
+                'created': self.created, 'evicted': self.evicted}
+
+    def __repr__(self):
+        s = self.stats()
+        ratio = 0.0
+        if s['requests'] > 0:
+            ratio = float(s['reused']) / s['requests']
+        return ("%s: %d requests, %d reused (%.2f), %d created, %d evicted"
+                % (self.server, s['requests'], s['reused'], ratio,
+                   s['created'], s['evicted']))
+
+
+pools = dict()
+poolsLock = Lock()
+poolsPid = os.getpid()
+
+def configure(size=None, idleTimeout=None):
+    # Sets the size and the idle timeout of the pools created from now on.
+    # Called before the plan is executed, so forked processes inherit it.
+    global POOL_SIZE, IDLE_TIMEOUT
+    if size is not None:
+        POOL_SIZE = size
+    if idleTimeout is not None:
+        IDLE_TIMEOUT = idleTimeout
+
+def getPool(server):
+    # Returns the pool of the endpoint 'server' (host[:port]) for this process.
+    global pools, poolsLock, poolsPid
+    if os.getpid() != poolsPid:
+        # Forked process: do not share the parent's sockets nor locks.
+        pools = dict()
+        poolsLock = Lock()
+        poolsPid = os.getpid()
+    poolsLock.acquire()
+    try:
+        pool = pools.get(server, None)
+        if pool is None:
+            pool = ConnectionPool(server, POOL_SIZE, IDLE_TIMEOUT)
+            pools[server] = pool
+        return pool
+    finally:
+        poolsLock.release()
+
+def logStats(server=None):
+    # Writes the reuse statistics of the pools of this process in the log.
+    for s in pools:
+        if (server is None) or (s == server):
+            logger.info(pools[s])
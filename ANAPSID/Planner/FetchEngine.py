@@ -0,0 +1,144 @@
+'''
+Created on Oct 18, 2026
+
+Implements the engine that evaluates the subqueries sent to the sources
+within the process of the operator, instead of starting a new process
+for every subquery.
+
+An engine is kept for every process. Its workers take the subqueries
+from a single queue and evaluate them over the keep-alive connections
+of the process, so the requests of a plan node (e.g., the instantiated
+subqueries of a nested join) are sent concurrently without forking.
+At most WORKERS subqueries are evaluated at the same time; the
+connection pool still bounds the requests sent to the same endpoint.
+
+The tuples are put in the queue given by the operator, followed by
+"EOF", as if the subquery was evaluated by its own process, so the
+operators are not aware of the engine.
+'''
+import os
+import logging
+from Queue import Queue
+from threading import Thread, Event, Lock
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.FileHandler('.connections.log')
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+ENABLED = True
+WORKERS = 16      # Subqueries evaluated at the same time by a process.
+
+
+def configure(enabled=None, workers=None):
+    # Called before the plan is executed, so forked processes inherit it.
+    global ENABLED, WORKERS
+    if enabled is not None:
+        ENABLED = enabled
+    if workers is not None:
+        WORKERS = workers
+
+
+class Job(object):
+    '''
+    Represents a subquery submitted to the engine.
+    It is composed by the arguments of the contact function, the
+    function called when the subquery is evaluated, and the event that
+    signals it.
+    '''
+    def __init__(self, contact, args, callback=None):
+        self.contact  = contact
+        self.args     = args
+        self.callback = callback
+        self.complete = None
+        self.done     = Event()
+
+    def run(self):
+        queue = self.args[2]
+        try:
+            self.contact(*self.args)
+            self.complete = True
+        except SystemExit as e:
+            # contactSource exits with an error code when the answer is
+            # incomplete; the EOF has already been put.
+            self.complete = not e.code
+        except Exception as e:
+            logger.info("error evaluating a subquery: " + str(e))
+            self.complete = False
+            queue.put("EOF")
+        if self.callback is not None:
+            try:
+                self.callback(self.complete)
+            except Exception as e:
+                logger.info("error after evaluating a subquery: " + str(e))
+        self.done.set()
+
+    def wait(self):
+        # Returns whether the answer was complete.
+        self.done.wait()
+        return self.complete
+
+
+class FetchEngine(object):
+    '''
+    Represents the engine of a process.
+    It is composed by the queue of submitted jobs and the workers that
+    evaluate them, which are started as they are needed.
+    '''
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self.jobs    = Queue()
+        self.threads = []
+        self.idle    = 0
+        self.lock    = Lock()
+        self.served  = 0
+
+    def submit(self, contact, args, callback=None):
+        # Evaluates contact(*args) by a worker, and returns the job.
+        job = Job(contact, args, callback)
+        self.lock.acquire()
+        try:
+            if (self.idle == 0) and (len(self.threads) < self.workers):
+                t = Thread(target=self.work)
+                t.daemon = True
+                self.threads.append(t)
+                t.start()
+            else:
+                self.idle -= 1
+        finally:
+            self.lock.release()
+        self.jobs.put(job)
+        return job
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            job.run()
+            self.lock.acquire()
+            try:
+                self.idle += 1
+                self.served += 1
+            finally:
+                self.lock.release()
+
+    def __repr__(self):
+        return ("%d subqueries evaluated by %d workers"
+                % (self.served, len(self.threads)))
+
+
+engine = None
+enginePid = None
+
+def getEngine():
+    # Returns the engine of this process, or None if it is disabled.
+    global engine, enginePid
+    if not ENABLED:
+        return None
+    if (engine is None) or (enginePid != os.getpid()):
+        # Forked process: the workers of the parent do not exist here.
+        engine = FetchEngine(WORKERS)
+        enginePid = os.getpid()
+    return engine
@@ -0,0 +1,186 @@
+'''
+Created on Oct 18, 2026
+
+Implements the controller that chooses the size of the pages (LIMIT)
+used to contact an endpoint incrementally.
+
+The first page of a query is small, so the first answers arrive
+quickly. The page size is doubled while the throughput (tuples per
+second) of the full pages keeps improving and the pages take less than
+TARGET_LATENCY seconds. Errors halve the page size. When an endpoint
+truncates its answers (e.g., Virtuoso's ResultSetMaxRows), the limit is
+learnt and pages are never larger than it.
+
+The learnt values are stored in a small state file (JSON), shared by all
+the processes of a plan and by the next executions.
+'''
+from __future__ import division
+import json
+import os
+import fcntl
+from tempfile import NamedTemporaryFile
+
+MIN_PAGE_SIZE   = 100      # Size of the first page.
+MAX_PAGE_SIZE   = 10000    # Pages are never larger than this.
+TARGET_LATENCY  = 10.0     # Pages are not grown if they take longer (secs).
+IMPROVEMENT     = 1.1      # Throughput gain needed to keep growing.
+MAX_RETRIES     = 3        # Failed pages retried before giving up.
+
+ADAPTIVE        = True
+STATE_FILE      = '.pagesizes.json'
+
+
+def configure(adaptive=None, stateFile=None, maxPageSize=None):
+    # Called before the plan is executed, so forked processes inherit it.
+    global ADAPTIVE, STATE_FILE, MAX_PAGE_SIZE
+    if adaptive is not None:
+        ADAPTIVE = adaptive
+    if stateFile is not None:
+        STATE_FILE = stateFile
+    if maxPageSize is not None:
+        MAX_PAGE_SIZE = maxPageSize
+
+
+class PageSizeController(object):
+    '''
+    Chooses the page sizes of one endpoint during one incremental
+    contact. It is composed by the learnt state of the endpoint
+    (size, cap, errors) and the state of the current contact (current
+    size, throughput of the pages and whether it is still growing).
+    '''
+    def __init__(self, endpoint, limit):
+        self.endpoint   = endpoint
+        self.maxSize    = limit if limit > 0 else MAX_PAGE_SIZE
+        self.adaptive   = ADAPTIVE
+        state           = loadState().get(endpoint, {})
+        self.learnt     = state.get('size', None)
+        self.cap        = state.get('cap', None)
+        self.throughputs = {}      # Best throughput of every page size.
+        self.decided    = set()    # Page sizes already used to decide.
+        self.fullPages  = 0
+        self.guessedCap = None     # Cap before a truncation was guessed.
+        self.errors     = state.get('errors', 0)
+        self.growing    = True
+        self.retries    = 0
+        self.changed    = False
+        self.size       = self.bound(MIN_PAGE_SIZE)
+        if not self.adaptive:
+            self.size = self.maxSize
+
+    def bound(self, size):
+        size = max(min(size, self.maxSize), 1)
+        if self.cap:
+            size = min(size, self.cap)
+        return size
+
+    def nextSize(self):
+        # Size of the next page to request.
+        return self.size
+
+    def bestSize(self):
+        best = max(self.throughputs.values())
+        return min([size for size in self.throughputs if self.throughputs[size] == best])
+
+    def observe(self, size, cardinality, elapsed):
+        # Feedback of a page that was entirely received.
+        self.retries = 0
+        if not self.adaptive:
+            return
+        if (cardinality < size) or (elapsed <= 0):
+            # Short pages do not tell the throughput of the endpoint.
+            return
+        if self.guessedCap is not None and (cardinality == self.cap):
+            # The truncation was confirmed by another full page.
+            self.guessedCap = None
+        self.fullPages += 1
+        throughput = cardinality / elapsed
+        self.throughputs[size] = max(throughput, self.throughputs.get(size, 0))
+        if elapsed >= TARGET_LATENCY:
+            self.size = self.bound(size // 2)
+            self.growing = False
+            return
+        if (size != self.size) or (size in self.decided):
+            # Pages requested before the last decision (prefetched) are
+            # only measured.
+            return
+        if not self.decided and self.learnt and (self.learnt > size):
+            # After the first page, jump to the size learnt before.
+            self.size = self.bound(self.learnt)
+        elif self.growing:
+            previous = self.throughputs.get(size // 2, None)
+            if (previous is None) or (throughput >= previous * IMPROVEMENT):
+                self.size = self.bound(size * 2)
+            else:
+                # Larger pages do not pay off: keep the best size measured.
+                self.growing = False
+                self.size = self.bound(self.bestSize())
+        self.decided.add(size)
+
+    def error(self):
+        # A page failed. Returns False if the page must not be retried.
+        self.errors += 1
+        self.retries += 1
+        self.changed = True
+        if self.adaptive:
+            self.size = self.bound(self.size // 2)
+            self.growing = False
+            if self.learnt:
+                self.learnt = self.bound(self.learnt // 2)
+        return self.retries <= MAX_RETRIES
+
+    def truncated(self, size, cardinality):
+        # Decides whether a short page is the end of the answer or was
+        # truncated by the endpoint.
+        if cardinality == 0:
+            if self.guessedCap is not None:
+                # The answer really ended at the guessed cap.
+                self.cap = self.guessedCap or None
+                self.guessedCap = None
+            return False
+        if self.cap and (cardinality == self.cap):
+            return True
+        if self.adaptive and (cardinality % 1000 == 0):
+            # Endpoints usually truncate answers at round numbers. The
+            # guess costs one empty page when the answer ends there.
+            self.guessedCap = self.cap or 0
+            self.cap = cardinality
+            self.size = self.bound(self.size)
+            self.changed = True
+            return True
+        return False
+
+    def save(self):
+        # One full page alone does not tell which size is the best.
+        if (self.fullPages >= 2) and (self.bestSize() != self.learnt):
+            self.learnt = self.bestSize()
+            self.changed = True
+        if self.changed and self.adaptive:
+            saveState(self.endpoint, {'size': self.learnt, 'cap': self.cap,
+                                      'throughput': max(self.throughputs.values() or [0]),
+                                      'errors': self.errors})
+
+
+def loadState():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def saveState(endpoint, state):
+    # Updates the state of an endpoint. The file is locked while it is
+    # updated and it is replaced atomically, since several processes of
+    # the plan may learn at the same time.
+    lock = open(STATE_FILE + '.lock', 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        states = loadState()
+        states[endpoint] = state
+        directory = os.path.dirname(os.path.abspath(STATE_FILE))
+        f = NamedTemporaryFile('w', dir=directory, delete=False)
+        json.dump(states, f, indent=1, sort_keys=True)
+        f.close()
+        os.rename(f.name, STATE_FILE)
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
@@ -0,0 +1,290 @@
+'''
+Created on Oct 18, 2026
+
+Implements the pipelined execution of the plans: the whole plan is
+evaluated by one process, where every node is an iterator that pulls
+the tuples of its children, instead of a process per node connected
+to the others by queues.
+
+The subqueries of the leaves are submitted to the FetchEngine of the
+process (or evaluated by their own threads, with --no-fetch-engine)
+when the pipeline is built, so the sources are contacted at the same
+time and their answers are buffered while the iterators consume
+them. The operators that read both children as their tuples arrive
+(Xgjoin, Xgoptional, Xunion) receive them through one queue, tagged
+with the side; a subtree read this way is pulled by its own thread.
+
+The iterators produce the same tuples as the operators Xgjoin,
+NestedHashJoinFilter, Xgoptional, Xunion, Xproject, Xfilter, Xorderby,
+Xdistinct, Xlimit and Xoffset; as with processes, only the order of
+the answers may change. A node with another operator is evaluated by
+processes (TreePlan.execute), and its tuples are pulled from its
+channel.
+'''
+from Queue import Queue as LocalQueue, Empty
+from threading import Thread
+from ANAPSID.Planner.Plan import IndependentOperator
+from ANAPSID.Operators.Channel import Channel
+from ANAPSID.AnapsidOperators.Xdistinct import DistinctSet
+from ANAPSID.NonBlockingOperators import BindJoin
+from ANAPSID.Planner import FetchEngine
+from ANAPSID.Operators.Clock import monotonic
+from ANAPSID.Operators import Cancellation
+
+ENABLED = False
+LEFT    = -1    # Tag of the left tuples of nestedJoin; the instantiations are numbered from 0.
+
+
+def configure(enabled=None):
+    global ENABLED
+    if enabled is not None:
+        ENABLED = enabled
+
+
+class Tagger(object):
+    '''
+    Represents the queue of a child of a binary operator.
+    It is composed by the queue shared by both children, where the
+    tuples are put with the side of the child.
+    '''
+    def __init__(self, queue, side):
+        self.queue = queue
+        self.side  = side
+
+    def put(self, res):
+        self.queue.put((self.side, res))
+
+
+def execute(plan, out):
+    # Evaluates the plan, and puts its tuples in out followed by "EOF".
+    try:
+        for res in iterate(plan):
+            out.put(res)
+    finally:
+        out.put("EOF")
+
+def start(node, queue):
+    # Starts evaluating the node; its tuples and "EOF" are put in queue.
+    if isinstance(node, IndependentOperator):
+        if (FetchEngine.ENABLED):
+            node.execute(queue, False)
+            return
+        # Without the FetchEngine, execute returns once the whole answer
+        # is read, so the leaf is evaluated by its own thread. It ends
+        # when the process of the source is joined, so it is waited for.
+        t = Thread(target=node.execute, args=(queue,))
+        t.daemon = False
+    else:
+        t = Thread(target=execute, args=(node, queue))
+        t.daemon = True
+    t.start()
+
+def drain(queue):
+    res = queue.get(True)
+    while (res != "EOF"):
+        yield res
+        res = queue.get(True)
+
+def iterate(node):
+    # Returns the iterator of the tuples of the node. The sources of the
+    # node are contacted now, before the first tuple is pulled.
+    if isinstance(node, IndependentOperator):
+        queue = LocalQueue()
+        start(node, queue)
+        return drain(queue)
+    name = node.operator.__class__.__name__
+    if (name in BINARY):
+        return BINARY[name](node.operator, both(node.left, node.right))
+    if (name in NESTED):
+        return NESTED[name](node.operator, iterate(node.left), node.right)
+    if (name in UNARY):
+        return UNARY[name](node.operator, iterate(node.left))
+    # Other operators are evaluated by processes.
+    channel = Channel()
+    node.execute(channel)
+    return drain(channel)
+
+def both(left, right):
+    # Yields (side, tuple) as the tuples of the children arrive.
+    queue = LocalQueue()
+    start(left, Tagger(queue, 0))
+    start(right, Tagger(queue, 1))
+    ended = 0
+    while (ended < 2):
+        (side, res) = queue.get(True)
+        if (res == "EOF"):
+            ended += 1
+        else:
+            yield (side, res)
+
+
+def gjoin(operator, tuples):
+    # Xgjoin: every tuple is probed against the tuples of the other side.
+    tables = ({}, {})
+    for (side, res) in tuples:
+        r = operator.key(res)
+        for other in tables[1 - side].get(r, ()):
+            x = {}
+            x.update(other)
+            x.update(res)
+            yield x
+        tables[side].setdefault(r, []).append(res)
+
+def goptional(operator, tuples):
+    # Xgoptional: the left tuples without matches are produced at the
+    # end, with empty values for the variables of the right side.
+    tables = ({}, {})
+    bag = []    # [tuple, matched] of the left side.
+    for (side, res) in tuples:
+        r = operator.key(res)
+        record = [res, False]
+        for other in tables[1 - side].get(r, ()):
+            x = other[0].copy()
+            x.update(res)
+            yield x
+            other[1] = True
+            record[1] = True
+        tables[side].setdefault(r, []).append(record)
+        if (side == 0):
+            bag.append(record)
+    for (res, matched) in bag:
+        if not matched:
+            x = dict([(var, '') for var in operator.vars_right])
+            x.update(res)
+            yield x
+
+def union(operator, tuples):
+    # Xunion: the variables of the other side get empty values.
+    if (operator.vars_left == operator.vars_right):
+        for (side, res) in tuples:
+            yield res
+        return
+    empty = (dict([(var, '') for var in operator.vars_right]),
+             dict([(var, '') for var in operator.vars_left]))
+    for (side, res) in tuples:
+        x = {}
+        x.update(empty[side])
+        x.update(res)
+        yield x
+
+def nestedJoin(operator, left, right_operator):
+    # NestedHashJoinFilter: the right operator is instantiated with the
+    # values of the join variables of every window of new left tuples.
+    # The left tuples are pulled by a thread, and arrive in the same
+    # queue as the answers of the instantiations, which are joined as
+    # they arrive. The windows are chosen by a WindowController; a window
+    # that is not full is sent at its deadline, even if no tuple arrives.
+    left_table = {}
+    right_table = {}
+    events = LocalQueue()
+    running = 0
+    count = 0
+    controller = BindJoin.WindowController(right_operator)
+    feeder = Thread(target=feed, args=(left, Tagger(events, LEFT)))
+    feeder.daemon = True
+    feeder.start()
+
+    filter_bag = []
+    since = None
+    ended = False
+    while not ended or (running > 0):
+        try:
+            (instance, res) = events.get(True, controller.timeout(since) if filter_bag else None)
+        except Empty:
+            instance = None
+        if (instance == LEFT):
+            if (res == "EOF"):
+                ended = True
+            else:
+                r = operator.getResource(res)
+                for t in right_table.get(r, ()):
+                    x = t.copy()
+                    x.update(res)
+                    yield x
+                if not (r in left_table):
+                    if not filter_bag:
+                        since = monotonic()
+                    filter_bag.append(res)
+                left_table.setdefault(r, []).append(res)
+        elif (instance is not None):
+            if (res == "EOF"):
+                running -= 1
+                controller.finished(instance)
+            else:
+                controller.received(instance)
+                r = operator.getResource(res)
+                for var in operator.vars:
+                    del res[var]
+                for t in left_table.get(r, ()):
+                    x = t.copy()
+                    x.update(res)
+                    yield x
+                right_table.setdefault(r, []).append(res)
+        # The window is sent when it is full or due, or when the left
+        # tuples ended.
+        if filter_bag and (ended or controller.full(filter_bag, since)):
+            controller.sent(count, len(filter_bag))
+            start(operator.makeInstantiation(filter_bag, right_operator), Tagger(events, count))
+            running += 1
+            count += 1
+            filter_bag = []
+
+def feed(tuples, queue):
+    # Puts the tuples in queue, followed by "EOF".
+    try:
+        for res in tuples:
+            queue.put(res)
+    finally:
+        queue.put("EOF")
+
+def project(operator, tuples):
+    names = [var.name[1:] for var in operator.vars]
+    for res in tuples:
+        yield dict([(name, res.get(name, '')) for name in names])
+
+def filterTuples(operator, tuples):
+    test = operator.test
+    for res in tuples:
+        if test(res):
+            yield res
+
+def orderby(operator, tuples):
+    for res in operator.sort(tuples):
+        yield res
+
+def distinct(operator, tuples):
+    seen = DistinctSet(operator.memorySize)
+    try:
+        for res in tuples:
+            if seen.add(res):
+                yield res
+    finally:
+        seen.close()
+
+def limit(operator, tuples):
+    # The plan is cancelled once the limit is reached.
+    count = 0
+    if (count >= operator.limit):
+        Cancellation.cancel()
+        return
+    for res in tuples:
+        count += 1
+        if (count >= operator.limit):
+            Cancellation.cancel()
+            yield res
+            return
+        yield res
+
+def offset(operator, tuples):
+    count = 0
+    for res in tuples:
+        if (count < operator.offset):
+            count += 1
+        else:
+            yield res
+
+
+BINARY = {'Xgjoin': gjoin, 'Xgoptional': goptional, 'Xunion': union}
+NESTED = {'NestedHashJoinFilter': nestedJoin}
+UNARY  = {'Xproject': project, 'Xfilter': filterTuples, 'Xorderby': orderby,
+          'Xdistinct': distinct, 'Xlimit': limit, 'Xoffset': offset}
@@ -13,7 +13,7 @@ Last modification: December, 2013
 from __future__ import division
 from multiprocessing import Process, Queue, active_children
 from ANAPSID.Catalog.Catalog import Catalog
-from ANAPSID.AnapsidOperators.Xgjoin import Xgjoin
+from ANAPSID.AnapsidOperators.Xgjoin import Xgjoin, shareMemory
 from ANAPSID.AnapsidOperators.Xnjoin import Xnjoin
 from ANAPSID.AnapsidOperators.Xgoptional import Xgoptional
 from ANAPSID.AnapsidOperators.Xnoptional import Xnoptional
@@ -34,9 +34,21 @@ from ANAPSID.BlockingOperators.HashOptional import HashOptional
 from ANAPSID.BlockingOperators.NestedLoopOptional import NestedLoopOptional
 from ANAPSID.BlockingOperators.NestedLoopJoin import NestedLoopJoin
 from ANAPSID.BlockingOperators.Union import Union
+from ANAPSID.Operators import Channel
+from ANAPSID.Operators import Cancellation
 from ANAPSID.Decomposer.Tree import Leaf, Node
 from ANAPSID.Decomposer.services import Service, Argument, Triple, Filter, Optional
 from ANAPSID.Decomposer.services import UnionBlock, JoinBlock, Query
+from ANAPSID.Planner import ConnectionPool
+from ANAPSID.Planner.ResultsParser import JSONResultsParser
+from ANAPSID.Planner.PageSize import PageSizeController
+from ANAPSID.Planner import PageSize
+from ANAPSID.Planner import ResultCache
+from ANAPSID.Planner import FetchEngine
+from ANAPSID.Planner import Statistics
+from ANAPSID.Catalog import EndpointOptions
+from Queue import Queue as LocalQueue
+from threading import Thread
 #from SPARQLWrapper import SPARQLWrapper, JSON, N3
 import socket
 import urllib
@@ -48,6 +60,14 @@ import sys, os
 import re
 
 endpType = None
+MAX_GET_LENGTH = 2048   # Longer queries (e.g., with VALUES) are sent by POST.
+PROJECTION = True       # Whether the edges of the plans carry only the variables needed.
+
+
+def configure(projection=None):
+    global PROJECTION
+    if projection is not None:
+        PROJECTION = projection
 
 
 def contactSource(server, query, queue, buffersize=16384, limit=-1):
@@ -56,7 +76,6 @@ def contactSource(server, query, queue, buffersize=16384, limit=-1):
     #and is stored in a queue.
     #print "in *NEW* contactSource"
     b = None
-    cardinality = 0
     
     referer = server
     server = server.split("http://")[1]
@@ -68,38 +87,132 @@ def contactSource(server, query, queue, buffersize=16384, limit=-1):
     #print 'limit', limit 
     #print 'query', query
     if (limit == -1):
-        b, cardinality  = contactSourceAux(referer, server, path, port, query, queue)
+        b, cardinality, status = contactSourceAux(referer, server, path, port, query, queue, buffersize)
+        complete = (status == httplib.OK)
     else:
-        #Contacts the datasource (i.e. real endpoint) incrementally, 
-        #retreiving partial result sets combining the SPARQL sequence
-        #modifiers LIMIT and OFFSET.
-        
-        # Set up the offset.
-        offset = 0
-        
-        while True:
-            query_copy = query + " LIMIT " + str(limit) + " OFFSET " + str(offset)
-            #print query_copy
-            b, cardinality = contactSourceAux(referer, server, path, port, query_copy, queue)
-            if (cardinality < limit):
-                break
-            
-            offset = offset + limit
-   
-   
+        prefetch = EndpointOptions.getOption(referer, 'prefetch', 1)
+        b, complete = contactSourcePages(referer, server, path, port, query, queue, buffersize, limit, prefetch)
+
+    if (limit != -1):
+        # Report how many pages reused the kept-alive connection.
+        ConnectionPool.logStats(server)
+
     #Close the queue
     if b == None:
         queue.put("EOF")
 
+    if (not complete) or Cancellation.cancelled():
+        # The exit code of the process tells the operator that the
+        # answer is incomplete or failed (e.g., it must not be cached).
+        sys.exit(1)
+
     return b
 
 
-        
-def contactSourceAux(referer, server, path, port, query, queue):
+
+class PageFetch(Thread):
+    '''
+    Retrieves one page (LIMIT/OFFSET) of a query in its own thread.
+    The tuples are stored in a local queue, followed by "EOP", so the
+    page can be delivered while it is still being received.
+    '''
+    def __init__(self, referer, server, path, port, query, offset, size, buffersize):
+        Thread.__init__(self)
+        self.daemon = True
+        self.args = (referer, server, path, port)
+        self.query = query + " LIMIT " + str(size) + " OFFSET " + str(offset)
+        self.offset = offset
+        self.size = size
+        self.buffersize = buffersize
+        self.tuples = LocalQueue()
+        self.b = None
+        self.cardinality = 0
+        self.elapsed = 0
+        self.error = None
+
+    def run(self):
+        (referer, server, path, port) = self.args
+        t = time.time()
+        try:
+            self.b, self.cardinality, status = contactSourceAux(referer, server, path, port,
+                                                                self.query, self.tuples, self.buffersize)
+            if (status != httplib.OK):
+                self.error = httplib.HTTPException("the source " + server + " answered with status " + str(status))
+        except Exception as e:
+            self.error = e
+        self.elapsed = time.time() - t
+        self.tuples.put("EOP")
+
+def contactSourcePages(referer, server, path, port, query, queue, buffersize, limit, prefetch):
+    #Contacts the datasource (i.e. real endpoint) incrementally, 
+    #retreiving partial result sets combining the SPARQL sequence
+    #modifiers LIMIT and OFFSET. The size of every page is chosen by the
+    #PageSizeController of the endpoint (at most 'limit'), and 'prefetch'
+    #pages are requested at the same time. The pages are added to the
+    #queue in order, and no more pages are requested after a short page.
+    #Returns whether the answer was entirely retrieved.
+    b = None
+    complete = True
+    controller = PageSizeController(referer, limit)
+    pages = []
+    offset = 0
+
+    while True:
+        if Cancellation.cancelled():
+            # No more pages are needed; the pages in flight are discarded.
+            complete = False
+            break
+
+        # Keep 'prefetch' pages requested.
+        while (len(pages) < prefetch):
+            size = controller.nextSize()
+            page = PageFetch(referer, server, path, port, query, offset, size, buffersize)
+            page.start()
+            pages.append(page)
+            offset = offset + size
+
+        # Deliver the oldest page while the following ones are received.
+        page = pages.pop(0)
+        delivered = 0
+        elem = page.tuples.get(True)
+        while (elem != "EOP"):
+            queue.put(elem)
+            delivered = delivered + 1
+            elem = page.tuples.get(True)
+
+        if page.error:
+            # Retry the rest of the page with a smaller size; the pages
+            # in flight are discarded.
+            if not controller.error():
+                print ("the source "+str(server)+" failed to answer the page at offset "
+                       +str(page.offset + delivered)+" ("+str(page.error)+"), then the rest of"
+                       +" the answer will be ignored")
+                complete = False
+                break
+            pages = []
+            offset = page.offset + delivered
+            continue
+
+        b = page.b
+        controller.observe(page.size, page.cardinality, page.elapsed)
+        if (page.cardinality < page.size):
+            if not controller.truncated(page.size, page.cardinality):
+                break
+            # The endpoint truncated the page: continue after its last tuple.
+            pages = []
+            offset = page.offset + page.cardinality
+
+    controller.save()
+    return (b, complete)
+
+def contactSourceAux(referer, server, path, port, query, queue, buffersize=16384):
+    # Returns the boolean of an ASK, the cardinality and the status of the
+    # answer. An answer that is not in JSON is reported with the status
+    # UNSUPPORTED_MEDIA_TYPE, so it is taken for a failure.
     
     # Setting variables to return.
     b = None
-    reslist = []
+    cardinality = 0
     
     # Formats of the response.
     json = "application/sparql-results+json"
@@ -110,47 +223,42 @@ def contactSourceAux(referer, server, path, port, query, queue):
     headers = {"User-Agent": "Anapsid/2.7", "Accept": "*/*", "Referer": referer, "Host": server}
     #print params
     
-    # Establish connection and get response from server.
-    conn = httplib.HTTPConnection(server)
-    #conn.set_debuglevel(1)
-    conn.request("GET", "/" + path + "?" + params, None, headers)
-    response = conn.getresponse()
+    # Get a (kept-alive) connection from the pool and get response from server.
+    pool = ConnectionPool.getPool(server)
+    if (len(params) > MAX_GET_LENGTH):
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+        (conn, response) = pool.request("POST", "/" + path, params, headers)
+    else:
+        (conn, response) = pool.request("GET", "/" + path + "?" + params, None, headers)
     
     #print response.status
-    if (response.status == httplib.OK):
-        res = response.read()
-        res = res.replace("false", "False")
-        res = res.replace("true", "True")
-        #print "raw results from endpoint", res 
-        res = eval(res)
-        
-        if type(res) == dict:
-            b = res.get('boolean', None)
-
-            if 'results' in res:
-                #print "raw results from endpoint", res 
-                for x in res['results']['bindings']:
-                    for key, props in x.iteritems():
-                        #Handle typed-literals and language tags
-                        suffix = ''
-                        if (props['type'] == 'typed-literal'):
-                            suffix = "^^<" +  props['datatype'].encode("utf-8") + ">"
-                        elif ("xml:lang" in props):
-                            suffix = '@' + props['xml:lang']
-                        x[key] = props['value'].encode("utf-8") + suffix
-
-                reslist = res['results']['bindings']
-
-                # Every tuple is added to the queue.
-                for elem in reslist:
-                    #print path, elem
-                    queue.put(elem)
-                #print "query", query, "endpoint", server, "cardinality", len(reslist)
-        else:
+    status = response.status
+    if (status == httplib.OK):
+        # Every tuple is added to the queue as soon as it is decoded.
+        parser = JSONResultsParser(response, buffersize)
+        try:
+            for elem in parser.bindings():
+                #print path, elem
+                queue.put(elem)
+                cardinality = cardinality + 1
+                if (cardinality % Cancellation.CHECK_EVERY == 0) and Cancellation.cancelled():
+                    # The rest of the answer is not needed.
+                    pool.discard(conn)
+                    return (None, cardinality, response.status)
+        except Exception:
+            pool.discard(conn)
+            raise
+        b = parser.boolean
+        #print "query", query, "endpoint", server, "cardinality", cardinality
+        if not parser.isJSON:
             print ("the source "+str(server)+" answered in "+ response.getheader("content-type")+" format, instead of"
                     +" the JSON format required, then that answer will be ignored")
+            status = httplib.UNSUPPORTED_MEDIA_TYPE
+    else:
+        response.read()
+    pool.release(conn, response)
             
-    return (b, len(reslist))
+    return (b, cardinality, status)
 
 def contactSourceOld(server, query, queue, buffersize=16384, limit=-1):
     
@@ -465,14 +573,19 @@ def contactProxy(server, query, queue, buffersize=16384, limit=50):
 def createPlan(query, adaptive, wc, buffersize, c, endpointType):
 
     endpType = endpointType
+    Cancellation.newPlan()
 
     #print "query", query
     operatorTree = includePhysicalOperatorsQuery(query, adaptive, wc,
                                                  buffersize, c)
    
-    # Adds the order by operator to the plan. 
+    # Adds the order by operator to the plan. With a LIMIT above it, only
+    # the first offset+limit tuples are kept, unless DISTINCT discards some.
     if (len(query.order_by) > 0):
-        operatorTree = TreePlan(Xorderby(query.order_by), operatorTree.vars, operatorTree)
+        top = -1
+        if (query.limit != -1) and not query.distinct:
+            top = max(int(query.offset), 0) + int(query.limit)
+        operatorTree = TreePlan(Xorderby(query.order_by, top), operatorTree.vars, operatorTree)
 
     # Adds the project operator to the plan.
     if (query.args != []):
@@ -495,9 +608,102 @@ def createPlan(query, adaptive, wc, buffersize, c, endpointType):
     #if (len(query.order_by) > 0):
     #    operatorTree = TreePlan(Xorderby(query.order_by), operatorTree.vars, operatorTree)
 
+    # The memory of the joins is divided among the Xgjoins of the plan.
+    joins = [n.operator for n in nodes(operatorTree) if isinstance(n.operator, Xgjoin)]
+    if joins:
+        shareMemory(joins)
+
+    if PROJECTION:
+        pushProjections(operatorTree)
+
     #print "Physical plan:", operatorTree
     return operatorTree
 
+def executePlan(plan, outputqueue):
+    # Evaluates the plan in a new process group, so its processes can be
+    # terminated together (terminatePlan).
+    os.setpgrp()
+    plan.execute(outputqueue)
+
+def terminatePlan(p):
+    # Called when the answer of the plan evaluated by the process p
+    # (executePlan) is complete. If the plan was cancelled, its processes
+    # are terminated, instead of draining the answers of the sources.
+    if Cancellation.cancelled():
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    elif p.is_alive():
+        try:
+            os.kill(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+def nodes(tree):
+    # Returns the TreePlan nodes of the plan.
+    if not isinstance(tree, TreePlan):
+        return []
+    return [tree] + nodes(tree.left) + nodes(tree.right)
+
+def pushProjections(tree, needed=None):
+    # Computes the variables sent through the edges from the children of
+    # every node: the variables needed above the node, and those used by
+    # its operator. needed is None when all the variables are needed
+    # (the answers, and below SELECT *).
+    if not isinstance(tree, TreePlan):
+        return
+    operator = tree.operator
+    name = operator.__class__.__name__
+    if (name == 'Xproject'):
+        used = set([arg.name[1:] for arg in operator.vars if not arg.constant])
+        needed = used if needed is None else (needed & used)
+    elif (name in ('Xdistinct', 'Xlimit', 'Xoffset', 'Xunion')):
+        pass
+    elif (name in PROJECTION_JOINS) or (name in PROJECTION_OPTIONALS):
+        if needed is not None:
+            if (name in PROJECTION_JOINS):
+                needed = needed | set(operator.vars)
+            else:
+                needed = needed | (set(operator.vars_left) & set(operator.vars_right))
+    elif (name == 'Xfilter'):
+        if needed is not None:
+            needed = needed | expressionVars(operator.filter.expr)
+    elif (name == 'Xorderby'):
+        if needed is not None:
+            for arg in operator.args:
+                needed = needed | expressionVars(arg)
+    else:
+        # Other operators receive all the variables of their children.
+        needed = None
+
+    children = [tree.left]
+    if not ("Nested" in name):
+        # The right node of a nested operator is instantiated, it is not an edge.
+        children.append(tree.right)
+    for (i, child) in enumerate(children):
+        if (child is None) or not hasattr(child, 'vars'):
+            continue
+        sent = None if (needed is None) else (needed & set(child.vars))
+        if (sent is not None) and (sent != set(child.vars)):
+            tree.projection[i] = sent
+        pushProjections(child, sent)
+
+def expressionVars(expr):
+    # The variables of an expression, without '?'; also those of the
+    # second argument of the functions.
+    if hasattr(expr, 'op'):
+        vs = expressionVars(expr.left)
+        if expr.right is not None:
+            vs = vs | expressionVars(expr.right)
+        return vs
+    return set([v[1:] for v in expr.getVars()])
+
+PROJECTION_JOINS = set(['Xgjoin', 'NestedHashJoinFilter', 'HashJoin',
+                        'SymmetricHashJoin', 'NestedLoopJoin'])
+PROJECTION_OPTIONALS = set(['Xgoptional', 'NestedHashOptionalFilter', 'HashOptional',
+                            'NestedLoopOptional'])
+
 def includePhysicalOperatorsQuery(query, a, wc, buffersize, c):
     return includePhysicalOperatorsUnionBlock(query, query.body,
                                               a, wc, buffersize, c)
@@ -565,20 +771,20 @@ def includePhysicalOperatorsOptional(left, rightList, a):
             
             if isinstance(l.left, IndependentOperator) and isinstance(l.left.tree, Leaf) and not(l.left.tree.service.allTriplesGeneral()):
                 if (l.left.constantPercentage() <= 0.5):
-                    l.left.tree.service.limit = 10000 # Fixed value, this can be learnt in the future 
+                    l.left.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                     #print "modifying limit optional left ..."
 
             if isinstance(l.right, IndependentOperator) and isinstance(l.right.tree, Leaf):
                 if not(dependent_op):
                     if (l.right.constantPercentage() <= 0.5) and not(l.right.tree.service.allTriplesGeneral()):
-                        l.right.tree.service.limit = 10000 # Fixed value, this can be learnt in the future 
+                        l.right.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                         #print "modifying limit optional right ..."
                 else:
                     new_constants = 0
                     for v in join_variables:
                         new_constants = new_constants + l.right.query.show().count(v)
                     if ((l.right.constantNumber() + new_constants)/l.right.places() <= 0.5) and not(l.right.tree.service.allTriplesGeneral()):
-                        l.right.tree.service.limit = 10000 # Fixed value, this can be learnt in the future
+                        l.right.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                         #print "modifying limit optional right ..."
 
         else:
@@ -672,7 +878,7 @@ def includePhysicalOperatorJoin(a, wc, l, r):
 
 	if isinstance(n.left, IndependentOperator) and isinstance(n.left.tree, Leaf):
 	    if (n.left.constantPercentage() <= 0.5) and not(n.left.tree.service.allTriplesGeneral()):
-                n.left.tree.service.limit = 10000 # Fixed value, this can be learnt in the future 
+                n.left.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                 #print "modifying limit left ..."   
     else:
         n =  TreePlan(HashJoin(join_variables), all_variables, l, r)
@@ -680,14 +886,14 @@ def includePhysicalOperatorJoin(a, wc, l, r):
     if isinstance(n.right, IndependentOperator) and isinstance(n.right.tree, Leaf):
         if not(dependent_join):
             if (n.right.constantPercentage() <= 0.5) and not(n.right.tree.service.allTriplesGeneral()):
-                n.right.tree.service.limit = 10000 # Fixed value, this can be learnt in the future
+                n.right.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                     #print "modifying limit right ..."
         else:
             new_constants = 0
             for v in join_variables:
                 new_constants = new_constants + n.right.query.show().count(v)
             if ((n.right.constantNumber() + new_constants)/n.right.places() <= 0.5) and not(n.right.tree.service.allTriplesGeneral()):
-                n.right.tree.service.limit = 10000 # Fixed value, this can be learnt in the future
+                n.right.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                 #print "modifying limit right ..."
     return n
 
@@ -823,6 +1029,15 @@ class IndependentOperator(object):
             self.joinCardinality.append((vars, c))
         return c
 
+    def prefetchCardinality(self, varsList):
+        # Starts obtaining the counts of the leaf, so they are obtained
+        # at the same time as the counts of the other leaves.
+        if self.cardinality == None:
+            prefetchCount(self.query, self.tree, set(), self.contact)
+        for vars in varsList:
+            if len(vars) > 0:
+                prefetchCount(self.query, self.tree, vars, self.contact)
+
     def allTriplesLowSelectivity(self):
         return self.tree.service.allTriplesLowSelectivity()
 
@@ -839,14 +1054,44 @@ class IndependentOperator(object):
     def aux(self, n):
         return self.tree.aux(n)
 
-    def execute(self, outputqueue):
+    def execute(self, outputqueue, wait=True):
+        # With wait=False, the subquery may still be evaluated when
+        # execute returns; its end is signaled by the EOF in outputqueue.
+
+        if Cancellation.cancelled():
+            outputqueue.put("EOF")
+            return
     
         if (self.tree.service.limit == -1) and (self.constantPercentage() <= 0.5) and not(self.tree.service.allTriplesGeneral()):
-            self.tree.service.limit=10000 #TODO: Fixed value, this can be learnt in the future
+            self.tree.service.limit = PageSize.MAX_PAGE_SIZE # Upper bound, the page size is learnt by PageSizeController
                 
+        # Answers of the same subquery are taken from the cache.
+        cache = ResultCache.getCache()
+        if cache is not None:
+            tuples = cache.lookup(self.server, self.query_str)
+            if tuples is not None:
+                for res in tuples:
+                    outputqueue.put(res)
+                outputqueue.put("EOF")
+                ResultCache.logStats()
+                return
+
+        # The answer is recorded for the cache, unless it is too large.
+        recorder = ResultCache.Recorder(outputqueue, cache)
+        args = (self.server, self.query_str, recorder, self.buffersize, self.tree.service.limit,)
+        finish = lambda complete: recorder.finish(self.server, self.query_str, complete)
+
+        # The subquery is evaluated by the engine of this process.
+        engine = FetchEngine.getEngine()
+        if engine is not None:
+            job = engine.submit(self.contact, args, finish)
+            if wait:
+                job.wait()
+            return
+
 	# Evaluate the independent operator.
         self.q = None
-        self.q = Queue()
+        self.q = Channel.Channel()
         self.p = Process(target=self.contact,
                          args=(self.server, self.query_str,
                                self.q, self.buffersize, self.tree.service.limit,)) 
@@ -857,31 +1102,27 @@ class IndependentOperator(object):
             res = self.q.get(True)
             # Put the result into the output queue.
             #print res
-            outputqueue.put(res)
+            recorder.put(res)
 
             # Check if there's no more data.
             if (res == "EOF"):
                 break
-                
-        self.p.terminate()
+
+        # Only complete answers are cached.
+        self.p.join()
+        finish(self.p.exitcode == 0)
 
     def __repr__(self):
         return str(self.tree)
 
 def askCount(query, tree, vars, contact):
     (server, query) = tree.getCount(query, vars, endpType)
-    q = Queue()
-    b = contact(server, query, q)
+    return Statistics.count(server, query, contact)
 
-    
-    res = q.get()
-    #print res
-    if (res == "EOF"):
-        return 20000
-    for k in res:
-        v = res[k]
-    q.get()
-    return int(v)
+def prefetchCount(query, tree, vars, contact):
+    # Starts obtaining the count, without waiting for it.
+    (server, query) = tree.getCount(query, vars, endpType)
+    Statistics.prefetch(server, query, contact)
 
 def onSignal(s, stackframe):
 
@@ -914,7 +1155,7 @@ class DependentOperator(object):
         #self.headersize = headersize
         self.buffersize = buffersize
         self.q = None
-        self.q = Queue()
+        self.q = Channel.Channel()
         self.atts = vs
         self.prefs = [] #query.prefs
         #self.atts = self.getQueryAttributes()
@@ -1010,6 +1251,8 @@ class TreePlan(object):
     It creates a process for every node of the plan.
     The left node is always evaluated.
     If the right node is an independent operator or a subtree, it is evaluated.
+    The tuples of the children are received through channels; the
+    transport of the edges can be chosen per node (channel).
     '''
     def __init__(self, operator, vars, left=None, right=None):
         self.operator = operator
@@ -1019,6 +1262,8 @@ class TreePlan(object):
         self.right = right
         self.cardinality = None
         self.joinCardinality = []
+        self.channel = None   # Transport of the edges, Channel.TRANSPORT if None.
+        self.projection = [None, None]   # Variables sent by the children, all if None (pushProjections).
 
     def __repr__(self):
         return self.aux(" ")
@@ -1073,6 +1318,7 @@ class TreePlan(object):
     def getCardinality(self):
 
         if self.cardinality == None:
+            self.prefetchCardinality([])
             self.cardinality = self.operator.getCardinality(self.left, self.right)
         return self.cardinality
 
@@ -1083,10 +1329,22 @@ class TreePlan(object):
                 c = c2
                 break
         if c == None:
+            self.prefetchCardinality([vars])
             c = self.operator.getJoinCardinality(self.left, self.right, vars)
             self.joinCardinality.append((vars, c))
         return c
 
+    def prefetchCardinality(self, varsList):
+        # The counts of all the leaves of the subtree are requested at
+        # once, before the operator waits for them one by one.
+        vs = getattr(self.operator, 'vars', None)
+        if vs:
+            varsList = varsList + [set(vs)]
+        if self.left:
+            self.left.prefetchCardinality(varsList)
+        if self.right:
+            self.right.prefetchCardinality(varsList)
+
     def aux(self, n):
         s = n + str(self.operator) + "\n" + n + str(self.vars) + "\n"
         if self.left:
@@ -1096,14 +1354,29 @@ class TreePlan(object):
             s = s + self.right.aux(n+"  ")
         return s
 
-    def execute(self, outputqueue):
-        # Evaluates the execution plan.
+    def makeChannel(self, child):
+        # Returns the channel of the edge from the child.
+        transport = self.channel or Channel.TRANSPORT
+        if (transport == 'leaves'):
+            # The answers of the sources are the bulk of the tuples.
+            transport = 'ring' if isinstance(child, IndependentOperator) else 'queue'
+        channel = Channel.create(transport)
+        if isinstance(child, IndependentOperator):
+            source = child.server
+        else:
+            source = child.operator.__class__.__name__
+        channel.label = source + " -> " + self.operator.__class__.__name__
+        return channel
+
+    def execute(self, outputqueue, wait=True):
+        # Evaluates the execution plan. The nodes are evaluated by their
+        # own processes, so it never waits for them.
         if self.left: #and this.right: # This line was modified by mac in order to evaluate unary operators
-            qleft  = Queue()
-            qright = Queue()
+            qleft  = self.makeChannel(self.left)
             # The left node is always evaluated.
             # Create process for left node
-            p1 = Process(target=self.left.execute, args=(qleft,))
+            p1 = Process(target=self.left.execute,
+                         args=(Channel.project(qleft, self.projection[0]),))
             p1.start()
     
             if ("Nested" in self.operator.__class__.__name__):
@@ -1118,8 +1391,9 @@ class TreePlan(object):
             # Check the right node to determine if evaluate it or not.
             if (self.right and ((self.right.__class__.__name__ == "IndependentOperator") or
                 (self.right.__class__.__name__ == "TreePlan"))):
-                #qright = Queue()
-                p2 = Process(target=self.right.execute, args=(qright,))
+                qright = self.makeChannel(self.right)
+                p2 = Process(target=self.right.execute,
+                             args=(Channel.project(qright, self.projection[1]),))
                 p2.start()
             else:
                 qright = self.right
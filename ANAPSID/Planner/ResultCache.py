@@ -0,0 +1,331 @@
+'''
+Created on Oct 18, 2026
+
+Implements a cache of the answers of the subqueries sent to the sources.
+
+The answers are indexed by the endpoint and the text of the subquery,
+normalized so that subqueries that only differ in white spaces share
+the entry. Every entry expires after TTL seconds. The entries are kept
+in memory within a budget of bytes, and the least recently used (LRU)
+entries are evicted first.
+
+The entries are also stored in a directory (CACHE_DIR), so they are
+shared by the processes of the plan and by the next executions: every
+leaf of a plan is evaluated by its own process, whose entries in memory
+are lost when it ends, so the memory only avoids reading the disk when
+a process evaluates the same subquery again (e.g., with --pipeline). The
+directory has its own budget of bytes, and the entries least recently
+used are removed first. An entry on disk is a sequence of marshalled
+tuples, so a hit is streamed without loading the whole answer.
+
+Only complete answers are stored. The cache of a process is shared by
+the threads that evaluate its subqueries (FetchEngine).
+'''
+import os
+import re
+import marshal
+import hashlib
+import logging
+from collections import OrderedDict
+from tempfile import mkstemp
+from threading import RLock
+from time import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler = logging.FileHandler('.cache.log')
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+ENABLED     = True
+MEMORY_SIZE = 64 * 1024 * 1024     # Bytes of answers kept in memory.
+DISK_SIZE   = 1024 * 1024 * 1024   # Bytes of answers kept in CACHE_DIR.
+TTL         = 3600                 # Seconds an answer is valid.
+CACHE_DIR   = '.resultcache'       # Directory of the entries on disk.
+
+TUPLE_OVERHEAD = 80                # Approximate bytes of a tuple besides its strings.
+SUFFIX         = '.cache'
+
+# Literals and IRIs are kept as they are; white spaces are collapsed.
+TOKENS = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|<[^<>\s]*>|\s+)')
+
+
+def configure(enabled=None, memorySize=None, diskSize=None, ttl=None, directory=None):
+    # Called before the plan is executed, so forked processes inherit it.
+    global ENABLED, MEMORY_SIZE, DISK_SIZE, TTL, CACHE_DIR, cache
+    if enabled is not None:
+        ENABLED = enabled
+    if memorySize is not None:
+        MEMORY_SIZE = memorySize
+    if diskSize is not None:
+        DISK_SIZE = diskSize
+    if ttl is not None:
+        TTL = ttl
+    if directory is not None:
+        CACHE_DIR = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    cache = None
+
+def normalizeQuery(query):
+    parts = []
+    for token in TOKENS.split(query):
+        if token.isspace():
+            parts.append(' ')
+        elif token:
+            parts.append(token)
+    return ''.join(parts).strip()
+
+def tupleSize(t):
+    size = TUPLE_OVERHEAD
+    for (k, v) in t.iteritems():
+        size = size + len(k) + len(v)
+    return size
+
+
+class ResultCache(object):
+    '''
+    Represents the cache of answers of a process.
+    It is composed by the entries kept in memory, in LRU order, the
+    directory of the entries stored on disk (if any), the lock of the
+    entries, and the counters of hits and misses.
+    '''
+    def __init__(self, memorySize, diskSize, ttl, directory=None):
+        self.memorySize  = memorySize
+        self.diskSize    = diskSize
+        self.ttl         = ttl
+        self.directory   = directory
+        self.entries     = OrderedDict()   # key -> (tuples, size, expires)
+        self.lock        = RLock()
+        self.size        = 0
+        self.hits        = 0
+        self.diskHits    = 0
+        self.misses      = 0
+        self.stores      = 0
+        self.evictions   = 0
+        self.expirations = 0
+
+    def key(self, server, query):
+        return server + ' ' + normalizeQuery(query)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + SUFFIX)
+
+    def maxEntrySize(self):
+        # Larger answers are not stored, so they do not flush the cache.
+        if self.directory:
+            return max(self.memorySize, self.diskSize) // 4
+        return self.memorySize // 4
+
+    def lookup(self, server, query):
+        # Returns an iterator on the tuples of the answer, or None.
+        self.lock.acquire()
+        try:
+            return self.lookupAux(self.key(server, query))
+        finally:
+            self.lock.release()
+
+    def lookupAux(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            (tuples, size, expires) = entry
+            if expires > time():
+                self.entries[key] = entry
+                self.hits += 1
+                logger.info("hit " + key)
+                # Copies, so the consumers can not modify the entry.
+                return (dict(t) for t in tuples)
+            self.size -= size
+            self.expirations += 1
+        if self.directory:
+            tuples = self.load(key)
+            if tuples is not None:
+                self.diskHits += 1
+                logger.info("disk hit " + key)
+                return tuples
+        self.misses += 1
+        logger.info("miss " + key)
+        return None
+
+    def load(self, key):
+        # Opens the entry stored on disk, and returns the generator of its tuples.
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            (k, expires, count, size) = marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            f.close()
+            return None
+        if (k != key) or (expires <= time()):
+            f.close()
+            if (k == key):
+                self.expirations += 1
+                self.remove(path)
+            return None
+        try:
+            # The modification time orders the entries on disk (LRU).
+            os.utime(path, None)
+        except OSError:
+            pass
+        return self.read(f, key, count, size, expires)
+
+    def read(self, f, key, count, size, expires):
+        keep = (size <= self.memorySize // 4)
+        tuples = []
+        try:
+            for i in xrange(count):
+                t = marshal.load(f)
+                if keep:
+                    tuples.append(t)
+                yield t
+        finally:
+            f.close()
+        if keep:
+            self.insert(key, tuples, size, expires)
+
+    def store(self, server, query, tuples, size):
+        # Stores the complete answer of the subquery.
+        key = self.key(server, query)
+        expires = time() + self.ttl
+        logger.info("store " + key + " (" + str(len(tuples)) + " tuples, " + str(size) + " bytes)")
+        self.lock.acquire()
+        try:
+            self.stores += 1
+            if size <= self.memorySize // 4:
+                self.insert(key, tuples, size, expires)
+        finally:
+            self.lock.release()
+        if self.directory and (size <= self.diskSize // 4):
+            self.write(key, tuples, size, expires)
+            self.evictDisk()
+
+    def insert(self, key, tuples, size, expires):
+        self.lock.acquire()
+        try:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (tuples, size, expires)
+            self.size += size
+            while (self.size > self.memorySize) and self.entries:
+                (_, (_, s, _)) = self.entries.popitem(last=False)
+                self.size -= s
+                self.evictions += 1
+        finally:
+            self.lock.release()
+
+    def write(self, key, tuples, size, expires):
+        # The entry is written in a temporary file and renamed, so other
+        # processes never read an incomplete entry.
+        (fd, name) = mkstemp(suffix='.tmp', dir=self.directory)
+        f = os.fdopen(fd, 'wb')
+        try:
+            marshal.dump((key, expires, len(tuples), size), f)
+            for t in tuples:
+                marshal.dump(t, f)
+            f.close()
+            os.rename(name, self.path(key))
+        except (IOError, OSError, ValueError):
+            f.close()
+            self.remove(name)
+
+    def evictDisk(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        files.sort()
+        for (_, size, path) in files:
+            if total <= self.diskSize:
+                break
+            self.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {'hits': self.hits, 'diskHits': self.diskHits, 'misses': self.misses,
+                'stores': self.stores, 'evictions': self.evictions,
+                'expirations': self.expirations, 'entries': len(self.entries),
+                'size': self.size}
+
+    def __repr__(self):
+        s = self.stats()
+        lookups = s['hits'] + s['diskHits'] + s['misses']
+        ratio = 0.0
+        if lookups > 0:
+            ratio = float(s['hits'] + s['diskHits']) / lookups
+        return ("%d lookups, %d hits, %d disk hits (%.2f), %d misses, %d stored, "
+                "%d evicted, %d expired, %d entries (%d bytes) in memory"
+                % (lookups, s['hits'], s['diskHits'], ratio, s['misses'], s['stores'],
+                   s['evictions'], s['expirations'], s['entries'], s['size']))
+
+
+class Recorder(object):
+    '''
+    Represents the queue of a subquery whose answer is cached.
+    It is composed by the queue of the operator, where the tuples are
+    forwarded, and the answer recorded so far, dropped if it is too
+    large to be stored.
+    '''
+    def __init__(self, queue, cache):
+        self.queue  = queue
+        self.cache  = cache
+        self.answer = [] if cache is not None else None
+        self.size   = 0
+
+    def put(self, res):
+        self.queue.put(res)
+        if (self.answer is None) or (res == "EOF"):
+            return
+        self.answer.append(res)
+        self.size = self.size + tupleSize(res)
+        if (self.size > self.cache.maxEntrySize()):
+            self.answer = None
+
+    def finish(self, server, query, complete):
+        # Only complete answers are cached.
+        if (self.answer is not None) and complete:
+            self.cache.store(server, query, self.answer, self.size)
+        if self.cache is not None:
+            logStats()
+
+
+cache = None
+
+def getCache():
+    # Returns the cache of this process, or None if the cache is disabled.
+    global cache
+    if not ENABLED:
+        return None
+    if cache is None:
+        if CACHE_DIR and not os.path.isdir(CACHE_DIR):
+            try:
+                os.makedirs(CACHE_DIR)
+            except OSError:
+                # Created meanwhile by another process of the plan.
+                pass
+        cache = ResultCache(MEMORY_SIZE, DISK_SIZE, TTL, CACHE_DIR)
+    return cache
+
+def logStats():
+    if cache is not None:
+        logger.info(cache)
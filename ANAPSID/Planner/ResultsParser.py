@@ -0,0 +1,151 @@
+'''
+Created on Oct 18, 2026
+
+Implements an incremental parser for answers in the format
+application/sparql-results+json.
+
+The answer is read from the response in chunks of 'buffersize' bytes,
+and every binding is produced as soon as it has been decoded, without
+waiting for the whole document. Only the binding being decoded is kept
+in memory.
+'''
+import json
+
+WHITESPACE = ' \t\n\r'
+
+
+class IncompleteAnswer(ValueError):
+    '''
+    Raised when the answer ends before the JSON document is complete.
+    '''
+    pass
+
+
+class JSONResultsParser(object):
+    '''
+    Pull parser of a SPARQL JSON answer read from 'fp' (any object with
+    a read(n) method, e.g., an httplib response).
+
+    The bindings() generator produces the tuples of the answer as
+    Python dictionaries. After it is exhausted, 'boolean' contains the
+    answer of an ASK query (or None) and 'isJSON' tells whether the
+    answer was a JSON document.
+    '''
+    def __init__(self, fp, buffersize=16384):
+        self.fp         = fp
+        self.buffersize = buffersize
+        self.buf        = ''
+        self.pos        = 0
+        self.eof        = False
+        self.boolean    = None
+        self.isJSON     = True
+        self.decoder    = json.JSONDecoder()
+
+    def fill(self):
+        # Reads the next chunk of the answer. Returns False at the end.
+        if self.eof:
+            return False
+        data = self.fp.read(self.buffersize)
+        if not data:
+            self.eof = True
+            return False
+        # Discard the part of the buffer that has already been parsed.
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Returns the next non-whitespace character, without consuming it.
+        while True:
+            while (self.pos < len(self.buf)) and (self.buf[self.pos] in WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        c = self.peek()
+        if (c is None) or (c not in chars):
+            raise IncompleteAnswer("expected %r at position %d" % (chars, self.pos))
+        self.pos += 1
+        return c
+
+    def value(self):
+        # Decodes the next JSON value, reading more data until it is complete.
+        self.peek()
+        while True:
+            try:
+                (val, end) = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next chunk.
+                if (end < len(self.buf)) or self.eof or isinstance(val, (dict, list, basestring)):
+                    self.pos = end
+                    return val
+            except ValueError:
+                pass
+            if not self.fill():
+                (val, end) = self.decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return val
+
+    def members(self):
+        # Produces the keys of the object that starts at the current position.
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def bindings(self):
+        if self.peek() != '{':
+            # Not a JSON document; the answer is ignored.
+            self.isJSON = False
+            self.drain()
+            return
+        for key in self.members():
+            if key == 'results':
+                for rkey in self.members():
+                    if rkey == 'bindings':
+                        for elem in self.elements():
+                            yield elem
+                    else:
+                        self.value()
+            elif key == 'boolean':
+                self.boolean = self.value()
+            else:
+                self.value()
+        self.drain()
+
+    def elements(self):
+        # Produces the bindings of the array that starts at the current position.
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield decodeBinding(self.value())
+            if self.expect(',]') == ']':
+                return
+
+    def drain(self):
+        # Reads the rest of the answer, so the connection can be reused.
+        while self.fill():
+            self.pos = len(self.buf)
+
+
+def decodeBinding(x):
+    # Builds a tuple from a binding, handling typed-literals and language tags.
+    res = {}
+    for key, props in x.iteritems():
+        suffix = ''
+        if (props['type'] == 'typed-literal'):
+            suffix = "^^<" + props['datatype'].encode("utf-8") + ">"
+        elif ("xml:lang" in props):
+            suffix = '@' + props['xml:lang'].encode("utf-8")
+        res[key.encode("utf-8")] = props['value'].encode("utf-8") + suffix
+    return res
@@ -0,0 +1,188 @@
+'''
+Created on Oct 18, 2026
+
+Implements the store of the cardinalities (COUNT and COUNT DISTINCT)
+of the subqueries evaluated by the endpoints, used to estimate the cost
+of the plans.
+
+A count is indexed by the endpoint and the shape of its COUNT query:
+white spaces are collapsed and the variables are renamed in order of
+appearance, so the count of the same triple patterns and join variables
+is reused by other queries. The counts are kept in STATS_FILE and are
+valid for TTL seconds.
+
+The counts are fetched in threads, so all the counts needed by a plan
+can be requested at the same time (prefetch). Planning waits for them
+at most BUDGET seconds in total. Once the budget is spent, or if a
+COUNT query fails, the count is estimated with the stale count (if any)
+or DEFAULT_CARDINALITY. A count that arrives late is stored for the
+next executions.
+'''
+import os
+import re
+import json
+import fcntl
+from Queue import Queue
+from tempfile import mkstemp
+from threading import Thread, Lock
+from time import time
+from ANAPSID.Planner.ResultCache import TOKENS
+
+ENABLED             = True
+STATS_FILE          = '.statistics.json'
+TTL                 = 7 * 24 * 3600  # Seconds a count is valid.
+BUDGET              = 5.0            # Seconds planning may wait for counts.
+DEFAULT_CARDINALITY = 20000          # Estimate when nothing is known.
+
+VARIABLE = re.compile(r'[?$][A-Za-z0-9_]+')
+
+counts   = None      # key -> [count, time it was obtained]
+fetches  = {}        # key -> CountFetch in progress
+lock     = Lock()
+deadline = None      # End of the budget, set when planning first waits.
+
+
+def configure(enabled=None, statsFile=None, ttl=None, budget=None):
+    global ENABLED, STATS_FILE, TTL, BUDGET, counts
+    if enabled is not None:
+        ENABLED = enabled
+    if statsFile is not None:
+        STATS_FILE = statsFile
+        counts = None
+    if ttl is not None:
+        TTL = ttl
+    if budget is not None:
+        BUDGET = budget
+
+def shape(query):
+    # Variables are renamed outside literals and IRIs.
+    names = {}
+    def rename(m):
+        v = m.group(0)[1:]
+        if not (v in names):
+            names[v] = '?v' + str(len(names))
+        return names[v]
+    parts = []
+    for token in TOKENS.split(query):
+        if token.isspace():
+            parts.append(' ')
+        elif token[:1] in ('"', "'", '<'):
+            parts.append(token)
+        elif token:
+            parts.append(VARIABLE.sub(rename, token))
+    return ''.join(parts).strip()
+
+def key(server, query):
+    return server + ' ' + shape(query)
+
+def fetchCount(server, query, contact):
+    # Sends the COUNT query. Returns the count, or None if it failed.
+    q = Queue()
+    contact(server, query, q)
+    res = q.get()
+    if (res == "EOF"):
+        return None
+    for k in res:
+        v = res[k]
+    try:
+        # The count may be a typed literal, e.g., "12"^^xsd:integer.
+        return int(v.split("^^")[0])
+    except ValueError:
+        return None
+
+
+class CountFetch(Thread):
+    '''
+    Obtains one count in its own thread, and stores it.
+    '''
+    def __init__(self, key, server, query, contact):
+        Thread.__init__(self)
+        self.daemon = True
+        self.key = key
+        self.args = (server, query, contact)
+
+    def run(self):
+        try:
+            c = fetchCount(*self.args)
+        except Exception:
+            c = None
+        lock.acquire()
+        try:
+            if c is not None:
+                load()[self.key] = [c, time()]
+            del fetches[self.key]
+        finally:
+            lock.release()
+        if c is not None:
+            save(self.key, [c, time()])
+
+
+def load():
+    global counts
+    if counts is None:
+        counts = readFile()
+    return counts
+
+def readFile():
+    try:
+        with open(STATS_FILE, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def save(k, entry):
+    # The file is merged with the counts stored by other executions.
+    lockFile = open(STATS_FILE + '.lock', 'a')
+    try:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        es = readFile()
+        es[k] = entry
+        directory = os.path.dirname(os.path.abspath(STATS_FILE))
+        (fd, name) = mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(es, f, indent=0, sort_keys=True)
+        os.rename(name, STATS_FILE)
+    finally:
+        fcntl.flock(lockFile, fcntl.LOCK_UN)
+        lockFile.close()
+
+def fresh(entry):
+    return (entry is not None) and (time() - entry[1] < TTL)
+
+def prefetch(server, query, contact):
+    # Starts fetching the count, if it is not known nor being fetched.
+    # Returns the fetch in progress, or None.
+    if not ENABLED:
+        return None
+    k = key(server, query)
+    lock.acquire()
+    try:
+        if fresh(load().get(k, None)):
+            return None
+        t = fetches.get(k, None)
+        if t is None:
+            t = CountFetch(k, server, query, contact)
+            fetches[k] = t
+            t.start()
+        return t
+    finally:
+        lock.release()
+
+def count(server, query, contact):
+    # Returns the count of the query, or an estimate if it is not
+    # obtained within the budget.
+    global deadline
+    if not ENABLED:
+        c = fetchCount(server, query, contact)
+        return c if c is not None else DEFAULT_CARDINALITY
+    t = prefetch(server, query, contact)
+    entry = load().get(key(server, query), None)
+    if (t is not None) and (entry is None):
+        if deadline is None:
+            deadline = time() + BUDGET
+        t.join(max(deadline - time(), 0))
+        entry = load().get(key(server, query), None)
+    if entry is not None:
+        # A stale count is used while it is refreshed.
+        return entry[0]
+    return DEFAULT_CARDINALITY
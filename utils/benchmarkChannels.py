@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+Compares the transports of the edges of a plan on the pipeline
+
+    source -> Xfilter -> Xproject -> consumer
+
+where every node is a process, as in TreePlan. The source produces
+tuples of three bindings, Xfilter discards one tuple out of ten
+(FILTER (?o != ?l)) and Xproject keeps two of the variables.
+
+For every transport it reports the time to the first tuple and the
+total time of the consumer, and the throughput of the pipeline.
+
+Usage: benchmarkChannels.py [tuples] [-t transport ...]
+       transports: queue (multiprocessing.Queue), channel, ring
+'''
+import sys, os
+from time import time
+from multiprocessing import Process, Queue
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ANAPSID.Operators.Channel import Channel, RingChannel
+from ANAPSID.AnapsidOperators.Xfilter import Xfilter
+from ANAPSID.AnapsidOperators.Xproject import Xproject
+from ANAPSID.Decomposer.services import Filter, Expression, Argument
+
+TRANSPORTS = {'queue': Queue, 'channel': Channel, 'ring': RingChannel}
+
+
+def source(n, out):
+    for i in xrange(n):
+        o = str(i)
+        l = o if (i % 10 == 0) else 'label ' + o
+        out.put({'s': 'http://example.org/resource/' + o, 'o': o, 'l': l})
+    out.put("EOF")
+
+
+def run(n, transport):
+    make = TRANSPORTS[transport]
+    (q1, q2, q3) = (make(), make(), make())
+    xfilter = Xfilter(Filter(Expression('!=', Argument('?o', False), Argument('?l', False))))
+    xproject = Xproject([Argument('?s', False), Argument('?o', False)])
+    ps = [Process(target=source, args=(n, q1)),
+          Process(target=xfilter.execute, args=(q1, None, q2)),
+          Process(target=xproject.execute, args=(q2, None, q3))]
+    t0 = time()
+    for p in ps:
+        p.start()
+    count = 0
+    first = None
+    res = q3.get(True)
+    while (res != "EOF"):
+        if first is None:
+            first = time() - t0
+        count += 1
+        res = q3.get(True)
+    total = time() - t0
+    for p in ps:
+        p.join()
+    return (first, total, count)
+
+
+def main(argv):
+    n = 1000000
+    transports = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-t':
+            transports.append(argv[i+1])
+            i += 2
+        else:
+            n = int(argv[i])
+            i += 1
+    if not transports:
+        transports = ['queue', 'channel', 'ring']
+
+    print "%10s %10s %12s %10s %14s" % ("transport", "tuples", "first_tuple", "total", "tuples_per_s")
+    for transport in transports:
+        (first, total, count) = run(n, transport)
+        if count != n - (n + 9) // 10:
+            print "WARNING: %s produced %d tuples" % (transport, count)
+        print "%10s %10d %12.4f %10.2f %14.0f" % (transport, count, first, total, count / total)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
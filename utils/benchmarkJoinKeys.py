@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+'''
+Compares the keys of the hash tables of the joins: the concatenation of
+the values of the join variables, as the operators built them before,
+and the keys of ANAPSID.Operators.JoinKey.
+
+For every number of join variables, the tuples of the left input are
+inserted in a hash table and the tuples of the right input probe it.
+It reports the time to build the keys, the time of the join, and the
+number of matches; the matches of the concatenation include the false
+ones, e.g., ("ab", "c") and ("a", "bc").
+
+Usage: benchmarkJoinKeys.py [tuples] [-v vars ...]
+'''
+import sys, os
+from time import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ANAPSID.Operators.JoinKey import joinKey
+
+
+def concatenation(vars):
+    def key(tuple):
+        resource = ''
+        for var in vars:
+            resource = resource + tuple[var]
+        return resource
+    return key
+
+
+def inputs(n, vars):
+    # The values of the variables are split at different places in the
+    # left and right tuples, so the concatenation collides.
+    left = []
+    right = []
+    for i in xrange(n):
+        value = 'http://example.org/resource/' + str(i % (n // 4 + 1))
+        t1 = {'x': 'http://example.org/other/' + str(i)}
+        t2 = {'y': 'label ' + str(i)}
+        for (j, var) in enumerate(vars):
+            t1[var] = value + str(j)
+            t2[var] = value + str(j)
+        if (i % 10 == 0) and (len(vars) > 1):
+            (a, b) = (vars[0], vars[1])
+            t2[a] = t1[a][:-1]
+            t2[b] = t1[a][-1] + t1[b]
+        left.append(t1)
+        right.append(t2)
+    return (left, right)
+
+
+def run(key, left, right):
+    t0 = time()
+    for t in left:
+        key(t)
+    for t in right:
+        key(t)
+    keys = time() - t0
+    t0 = time()
+    table = {}
+    for t in left:
+        table.setdefault(key(t), []).append(t)
+    matches = 0
+    for t in right:
+        matches += len(table.get(key(t), ()))
+    return (keys, time() - t0, matches)
+
+
+def main(argv):
+    n = 200000
+    nvars = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-v':
+            nvars.append(int(argv[i+1]))
+            i += 2
+        else:
+            n = int(argv[i])
+            i += 1
+    if not nvars:
+        nvars = [1, 2, 3]
+
+    print "%5s %14s %10s %10s %10s" % ("vars", "key", "keys", "join", "matches")
+    for k in nvars:
+        vars = ['v' + str(j) for j in range(k)]
+        (left, right) = inputs(n, vars)
+        for (name, key) in (("concatenation", concatenation(vars)), ("joinKey", joinKey(vars))):
+            (keys, join, matches) = run(key, left, right)
+            print "%5d %14s %10.3f %10.3f %10d" % (k, name, keys, join, matches)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
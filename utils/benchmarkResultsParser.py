@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+'''
+Compares the incremental SPARQL JSON parser (JSONResultsParser) with
+the previous read()+eval() path of contactSourceAux.
+
+For answers of several sizes it reports the time to the first tuple,
+the total time and the peak memory (max RSS) of the process that parses.
+The answer is read from memory, optionally throttled to simulate the
+bandwidth of the endpoint.
+
+Usage: benchmarkResultsParser.py [size_MB ...] [-b bandwidth_MB_per_s]
+'''
+import sys, os, json, resource
+from StringIO import StringIO
+from time import time, sleep
+from multiprocessing import Process, Queue
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ANAPSID.Planner.ResultsParser import JSONResultsParser
+
+BUFFERSIZE = 16384
+
+
+class ThrottledReader(object):
+    # Wraps a file object and delays every read to simulate the bandwidth.
+    def __init__(self, fp, bandwidth):
+        self.fp = fp
+        self.bandwidth = bandwidth
+
+    def read(self, n=-1):
+        data = self.fp.read(n)
+        if self.bandwidth:
+            sleep(len(data) / self.bandwidth)
+        return data
+
+
+def makeAnswer(size):
+    # Builds a SPARQL JSON answer of approximately 'size' bytes.
+    row = {"s": {"type": "uri", "value": "http://example.org/resource/%d"},
+           "o": {"type": "typed-literal", "value": "%d",
+                 "datatype": "http://www.w3.org/2001/XMLSchema#integer"},
+           "l": {"type": "literal", "xml:lang": "en", "value": "label number %d"}}
+    template = json.dumps(row)
+    rows = []
+    total = 0
+    i = 0
+    while total < size:
+        r = template.replace("%d", str(i))
+        rows.append(r)
+        total += len(r) + 2
+        i += 1
+    return ('{"head": {"vars": ["s", "o", "l"]}, "results": {"distinct": false, '
+            + '"ordered": true, "bindings": [\n' + ',\n'.join(rows) + ']}}')
+
+
+def evalPath(fp, queue):
+    # The previous implementation of contactSourceAux.
+    res = fp.read()
+    res = res.replace("false", "False")
+    res = res.replace("true", "True")
+    res = eval(res)
+    for x in res['results']['bindings']:
+        for key, props in x.iteritems():
+            suffix = ''
+            if (props['type'] == 'typed-literal'):
+                suffix = "^^<" + props['datatype'].encode("utf-8") + ">"
+            elif ("xml:lang" in props):
+                suffix = '@' + props['xml:lang']
+            x[key] = props['value'].encode("utf-8") + suffix
+    for elem in res['results']['bindings']:
+        queue.put(elem)
+
+
+def streamPath(fp, queue):
+    parser = JSONResultsParser(fp, BUFFERSIZE)
+    for elem in parser.bindings():
+        queue.put(elem)
+
+
+class CollectingQueue(object):
+    # Records the time of the first tuple and counts the tuples.
+    def __init__(self):
+        self.first = None
+        self.count = 0
+        self.last = None
+
+    def put(self, elem):
+        if self.first is None:
+            self.first = time()
+        self.count += 1
+        self.last = elem
+
+
+def run(path, answer, bandwidth, out):
+    fp = ThrottledReader(StringIO(answer), bandwidth)
+    queue = CollectingQueue()
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time()
+    path(fp, queue)
+    t1 = time()
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out.put((queue.first - t0, t1 - t0, (rss1 - rss0) / 1024.0, queue.count, queue.last))
+
+
+def measure(path, answer, bandwidth):
+    out = Queue()
+    p = Process(target=run, args=(path, answer, bandwidth, out))
+    p.start()
+    r = out.get()
+    p.join()
+    return r
+
+
+def main(argv):
+    sizes = []
+    bandwidth = 0
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-b':
+            bandwidth = float(argv[i+1]) * 1024 * 1024
+            i += 2
+        else:
+            sizes.append(float(argv[i]))
+            i += 1
+    if not sizes:
+        sizes = [1, 5, 20]
+
+    print "%8s %10s %12s %10s %12s %8s" % ("size_MB", "path", "first_tuple", "total", "extra_RSS_MB", "tuples")
+    for size in sizes:
+        answer = makeAnswer(int(size * 1024 * 1024))
+        results = []
+        for (name, path) in [("eval", evalPath), ("stream", streamPath)]:
+            (first, total, rss, count, last) = measure(path, answer, bandwidth)
+            results.append((count, last))
+            print "%8.1f %10s %12.4f %10.4f %12.1f %8d" % (size, name, first, total, rss, count)
+        if results[0] != results[1]:
+            print "WARNING: the parsers produced different answers"
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+'''
+Fills the ASK cache of the source selection for a workload, without
+executing the queries. The source selection of every query is done once,
+so the next executions of the workload find the answers of their ASK
+queries in the cache.
+
+Usage: warmAskCache.py <endpoints_description> <decomposition> <query_file> ...
+       [--ask-cache <file>]
+'''
+import sys, os
+from tempfile import mkdtemp
+import shutil
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ANAPSID.Planner.Plan import contactSource
+from ANAPSID.Decomposer import decomposer
+from ANAPSID.Decomposer import askCache
+
+
+def main(argv):
+    if '--ask-cache' in argv:
+        i = argv.index('--ask-cache')
+        askCache.configure(cacheFile=argv[i+1])
+        argv = argv[:i] + argv[i+2:]
+    if len(argv) < 3:
+        print __doc__
+        sys.exit(1)
+    (endpoints, decomposition, queries) = (argv[0], argv[1], argv[2:])
+
+    # The reports of the source selection are not kept.
+    tmp = mkdtemp()
+    printAsk = os.path.join(tmp, 'ask')
+    printSourceSelection = os.path.join(tmp, 'sourceSelection')
+    printSourceSelectionTime = os.path.join(tmp, 'sourceSelectionTime')
+    try:
+        for queryFile in queries:
+            open(printAsk, 'w').close()
+            with open(queryFile) as f:
+                query = f.read()
+            decomposer.decompose(query, endpoints, decomposition, contactSource,
+                                 printAsk, printSourceSelection, printSourceSelectionTime)
+            with open(printAsk) as pa:
+                asks = pa.read()
+            with open(printSourceSelectionTime) as psst:
+                print "%s\t%s\t%s" % (queryFile, psst.read(), asks)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])